@@ -0,0 +1,116 @@
+import functools
+
+import pandas as pd
+import pytest
+from flask import Flask
+
+from wikimap import init_dashboard
+from wikimap.src import utils, sessions, hot_articles
+from wikimap.src.cache import LRUCache, TieredCache
+
+
+@pytest.fixture
+def hot_cache(monkeypatch):
+    """
+    An in-memory cache for the hot articles rankings.
+    """
+    cache = TieredCache(LRUCache())
+    monkeypatch.setattr(hot_articles, "get_cache", lambda: cache)
+    return cache
+
+
+@pytest.fixture
+def app(monkeypatch, hot_cache):
+    """
+    The Dash app, with a fake world of articles along the equator, one per
+    0.01° of longitude; article 0 at lon 0 is by far the most viewed. Each
+    geosearch finds the 11 articles nearest to the given longitude, and a
+    session keeps at most 15 articles.
+    """
+
+    def pagelist_around(lat, lon, radius=10000, gslimit=500):
+        first = int(round(lon * 100))
+        pageids = range(first - 5, first + 6)
+        return pd.DataFrame(
+            {
+                "title": [f"Ort {pageid}" for pageid in pageids],
+                "lat": 0.0,
+                "lon": [pageid / 100 for pageid in pageids],
+            },
+            index=pd.Index(pageids, name="pageid"),
+        )
+
+    def viewcounts(ids, days=30):
+        views = [1024 if pageid == 0 else 2 for pageid in ids]
+        return pd.Series(views, index=pd.Index(ids, name="pageid"), name="views")
+
+    monkeypatch.setattr(utils, "get_pagelist_around_location", pagelist_around)
+    monkeypatch.setattr(utils, "query_viewcounts", viewcounts)
+    monkeypatch.setattr(
+        utils,
+        "evict_articles",
+        functools.partial(utils.evict_articles, max_articles=15),
+    )
+    monkeypatch.setattr(sessions, "_store", LRUCache())
+    monkeypatch.setattr(
+        hot_articles.hot_articles_job, "prefetch", lambda lat, lon: None
+    )
+
+    return init_dashboard(Flask(__name__), route="/")
+
+
+@pytest.fixture
+def update_app(app):
+    """
+    Call update_app() over HTTP as the browser does after a pan to lon,
+    with the given client state. Returns {"id.property": value}.
+    """
+    client = app.test_client()
+    outputs = ["map.figure", "histogram.figure", "session.data"]
+    outputs += ["generation.data", "location.data"]
+
+    def call(lon, session_id=None, generation=None, location=None):
+        viewport = {
+            "mapbox.center": {"lat": 0.0, "lon": lon},
+            "mapbox.zoom": 15,
+            "mapbox._derived": {
+                "coordinates": [
+                    [lon - 0.03, 0.01],
+                    [lon + 0.03, 0.01],
+                    [lon + 0.03, -0.01],
+                    [lon - 0.03, -0.01],
+                ]
+            },
+        }
+        response = client.post(
+            "/_dash-update-component",
+            json={
+                "output": "..{}..".format("...".join(outputs)),
+                "outputs": [
+                    dict(zip(["id", "property"], output.split(".")))
+                    for output in outputs
+                ],
+                "inputs": [
+                    {"id": "slider", "property": "value", "value": [0, 1]},
+                    {"id": "viewport", "property": "data", "value": viewport},
+                ],
+                "changedPropIds": ["viewport.data"],
+                "state": [
+                    {"id": "session", "property": "data", "value": session_id},
+                    {"id": "generation", "property": "data", "value": generation},
+                    {
+                        "id": "location",
+                        "property": "data",
+                        "value": location or {"lat": 0.0, "lon": lon},
+                    },
+                ],
+            },
+        )
+        assert response.status_code == 200
+        return {
+            f"{component_id}.{prop}": value
+            for component_id, props in response.get_json()["response"].items()
+            for prop, value in props.items()
+        }
+
+    return call
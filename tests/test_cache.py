@@ -0,0 +1,162 @@
+import os
+
+import pytest
+
+from wikimap.src import cache
+from wikimap.src.cache import (
+    MISSING,
+    LRUCache,
+    SQLiteCache,
+    TieredCache,
+    cached,
+)
+
+
+class Clock:
+    """
+    Stands in for time.time() in the cache module.
+    """
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def sqlite_cache(tmp_path):
+    return SQLiteCache(tmp_path / "cache" / "cache.sqlite", purge_every=3)
+
+
+def _rows(sqlite_cache):
+    return (
+        sqlite_cache._connection().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+    )
+
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1  # "b" is now the least recently used
+    lru.set("c", 3)
+
+    assert lru.get("b") is MISSING
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+
+
+def test_lru_ttl(clock):
+    lru = LRUCache()
+    lru.set("a", 1, ttl=10)
+    lru.set("b", None)
+
+    clock.now += 9
+    assert lru.get("a") == 1
+    clock.now += 2
+    assert lru.get("a") is MISSING
+    # None is a value like any other, and without ttl it doesn't expire:
+    assert lru.get("b") is None
+
+
+def test_sqlite_roundtrip_and_expiry(sqlite_cache, clock):
+    sqlite_cache.set("a", {"x": [1, 2]}, ttl=10)
+    assert sqlite_cache.get("a") == {"x": [1, 2]}
+    assert sqlite_cache.get_entry("a") == ({"x": [1, 2]}, 1010.0)
+
+    clock.now += 11
+    assert sqlite_cache.get("a") is MISSING
+    # the expired row was deleted when read:
+    assert _rows(sqlite_cache) == 0
+
+
+def test_sqlite_purge(sqlite_cache, clock):
+    sqlite_cache.set("a", 1, ttl=1)
+    sqlite_cache.set("b", 2)
+    clock.now += 2
+    assert _rows(sqlite_cache) == 2
+
+    # the third write purges what has expired:
+    sqlite_cache.set("c", 3, ttl=1)
+    assert _rows(sqlite_cache) == 2
+    assert sqlite_cache.get("b") == 2
+
+
+def test_sqlite_directory_is_private(tmp_path):
+    SQLiteCache(tmp_path / "private" / "cache.sqlite")
+    assert os.stat(tmp_path / "private").st_mode & 0o077 == 0
+
+
+def test_sqlite_refuses_shared_directory(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+
+    with pytest.raises(PermissionError):
+        SQLiteCache(shared / "cache.sqlite")
+
+
+def test_tiered_promotes_with_remaining_ttl(sqlite_cache, clock):
+    writer = TieredCache(LRUCache(), sqlite_cache)
+    reader = TieredCache(LRUCache(), sqlite_cache)
+
+    writer.set("a", 1, ttl=10)
+    clock.now += 5
+    assert reader.get("a") == 1
+    assert "a" in reader.local._data
+
+    # expires in the promoted copy when it does in the shared tier:
+    clock.now += 6
+    assert reader.get("a") is MISSING
+    assert writer.get("a") is MISSING
+
+
+def test_tiered_without_ttl(sqlite_cache):
+    writer = TieredCache(LRUCache(), sqlite_cache)
+    reader = TieredCache(LRUCache(), sqlite_cache)
+
+    writer.set("a", 1)
+    assert reader.get("a") == 1
+    assert reader.local.get("a") == 1
+
+
+def test_tiered_survives_failing_shared_tier():
+    class Broken:
+        def get_entry(self, key):
+            raise OSError("down")
+
+        def set(self, key, value, ttl=None):
+            raise OSError("down")
+
+    tiered = TieredCache(LRUCache(), Broken())
+    assert tiered.get("a") is MISSING
+    tiered.set("a", 1)
+    assert tiered.get("a") == 1
+
+
+def test_cached_key_includes_defaults(monkeypatch):
+    tiered = TieredCache(LRUCache())
+    monkeypatch.setattr(cache, "get_cache", lambda: tiered)
+    calls = []
+
+    @cached("test")
+    def fetch(pageid, url="https://de.wikipedia.org"):
+        calls.append((pageid, url))
+        return pageid
+
+    fetch(1)
+    fetch(1, url="https://de.wikipedia.org")
+    fetch(pageid=1)
+    assert calls == [(1, "https://de.wikipedia.org")]
+
+    fetch(1, url="https://en.wikipedia.org")
+    assert len(calls) == 2
+    assert "test:(1, 'https://en.wikipedia.org')" in tiered.local._data
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+from wikimap.src import sessions
+from wikimap.src.spatial_index import SpatialIndex
+from wikimap.src.utils import evict_articles
+
+
+def known(rows):
+    """
+    :param rows: list of (pageid, lat, lon, last_seen)
+    """
+    pageids, lat, lon, last_seen = zip(*rows)
+    viewdata = pd.DataFrame(
+        {
+            "title": [f"Ort {pageid}" for pageid in pageids],
+            "lat": lat,
+            "lon": lon,
+            "views": 1,
+            "log_views": 0.0,
+            "last_seen": last_seen,
+        },
+        index=pd.Index(pageids, name="pageid"),
+    )
+    index = SpatialIndex()
+    index.insert(viewdata)
+    return index
+
+
+def test_within_budget_nothing_is_evicted():
+    index = known([(i, 0.0, i * 0.01, 0.0) for i in range(10)])
+
+    assert evict_articles(index, 0, 0, max_articles=10) is index
+
+
+def test_evicts_down_to_low_water():
+    index = known([(i, 0.0, i * 0.01, 0.0) for i in range(11)])
+
+    kept = evict_articles(index, 0, 0, max_articles=10, low_water=0.5)
+
+    assert len(kept) == 5
+    # the nearest ones, in their original order:
+    assert kept.frame().index.tolist() == [0, 1, 2, 3, 4]
+
+
+def test_age_bucket_before_distance():
+    near_and_old = [(i, 0.0, i * 0.001, 1000.0) for i in range(5)]
+    far_and_recent = [(10 + i, 1.0, i * 0.001, 5000.0) for i in range(5)]
+    index = known(near_and_old + far_and_recent)
+
+    kept = evict_articles(
+        index, 0, 0, max_articles=8, low_water=0.5, recency_bucket=600
+    )
+
+    assert kept.frame().index.tolist() == [10, 11, 12, 13]
+
+
+def test_distance_decides_within_a_bucket():
+    # seen a few minutes apart, the farther ones most recently:
+    rows = [(i, 0.0, i * 0.01, 5000.0 - (9 - i) * 10) for i in range(10)]
+    index = known(rows)
+
+    kept = evict_articles(
+        index, 0, 0, max_articles=8, low_water=0.5, recency_bucket=600
+    )
+
+    assert kept.frame().index.tolist() == [0, 1, 2, 3]
+
+
+def test_last_seen_survives_rebuild():
+    rows = [(i, 0.0, i * 0.01, 4000.0 + i) for i in range(10)]
+    index = known(rows)
+
+    kept = evict_articles(index, 0, 0, max_articles=8, low_water=0.5)
+
+    assert kept.frame().last_seen.tolist() == [4000.0, 4001.0, 4002.0, 4003.0]
+    assert kept.cell_size == index.cell_size
+    # the rebuilt index answers queries:
+    assert sorted(kept.query((-1, -1, 1, 1)).tolist()) == [0, 1, 2, 3]
+
+
+def test_max_log_views_survives_evicting_the_top_article(update_app):
+    response = update_app(lon=0.0)
+    assert response["location.data"]["max_log_views"] == 10.0
+
+    # pan away until the top article at lon 0 is evicted as the farthest:
+    for lon in [0.1, 0.2, 0.3]:
+        response = update_app(
+            lon=lon,
+            session_id=response["session.data"],
+            generation=response["generation.data"],
+            location=response["location.data"],
+        )
+
+    _, session = sessions.load_session(response["session.data"])
+    assert 0 not in session["known"]
+    assert np.max(session["known"].log_views) == 1.0
+    assert response["location.data"]["max_log_views"] == 10.0
@@ -0,0 +1,148 @@
+import pandas as pd
+import pytest
+
+from wikimap.src import hot_articles
+from wikimap.src.hot_articles import (
+    HotArticlesJob,
+    get_hot_articles,
+    rank_known,
+    tile_of,
+)
+from wikimap.src.spatial_index import SpatialIndex
+
+
+def known(rows):
+    """
+    :param rows: list of (pageid, lat, lon, views)
+    """
+    pageids, lat, lon, views = zip(*rows)
+    viewdata = pd.DataFrame(
+        {
+            "title": [f"Ort {pageid}" for pageid in pageids],
+            "lat": lat,
+            "lon": lon,
+            "views": views,
+            "log_views": 0.0,
+        },
+        index=pd.Index(pageids, name="pageid"),
+    )
+    index = SpatialIndex()
+    index.insert(viewdata)
+    return index
+
+
+def test_tile_of():
+    assert tile_of(0.05, 0.15) == (0, 1)
+    assert tile_of(-0.05, -0.15) == (-1, -2)
+
+
+def test_rank_known_keeps_the_tiles_top_articles(hot_cache):
+    index = known(
+        [
+            (1, 0.05, 0.05, 10),
+            (2, 0.02, 0.08, 30),
+            (3, 0.09, 0.01, 20),
+            (4, 0.15, 0.05, 99),  # in the tile to the north
+        ]
+    )
+
+    ranking = rank_known(index, 0.05, 0.05, top_k=2)
+
+    assert ranking.index.tolist() == [2, 3]
+    assert get_hot_articles(0.01, 0.01).index.tolist() == [2, 3]
+    assert list(ranking.columns) == ["title", "lat", "lon", "views", "log_views"]
+    assert rank_known(index, 0.5, 0.5) is None
+    assert get_hot_articles(0.5, 0.5) is None
+
+
+def test_rank_known_merges_visits(hot_cache):
+    rank_known(known([(1, 0.01, 0.01, 10), (2, 0.02, 0.02, 5)]), 0.05, 0.05, 2)
+    # a later visit sees other parts of the tile:
+    second_visit = known([(3, 0.08, 0.08, 7), (4, 0.15, 0.15, 99)])
+
+    ranking = rank_known(second_visit, 0.05, 0.05, top_k=2)
+
+    assert ranking.index.tolist() == [1, 3]
+    assert get_hot_articles(0.05, 0.05).index.tolist() == [1, 3]
+
+
+def test_rank_known_rewrites_only_changed_rankings(hot_cache, monkeypatch):
+    index = known([(1, 0.01, 0.01, 10), (2, 0.02, 0.02, 5)])
+    rank_known(index, 0.05, 0.05)
+
+    writes = []
+    monkeypatch.setattr(hot_cache, "set", lambda *args, **kwargs: writes.append(args))
+    rank_known(index, 0.05, 0.05)
+
+    assert writes == []
+
+
+@pytest.fixture
+def job(hot_cache):
+    """
+    A job whose thread does nothing, so that its queue can be looked at.
+    """
+    job = HotArticlesJob(radius=1, locations=[(5.05, 5.05)], pause=0)
+    job._run = lambda: None
+    return job
+
+
+def queued(job):
+    tiles = []
+    while not job._queue.empty():
+        priority, _, tile = job._queue.get()
+        if job._queued.get(tile) == priority:
+            tiles.append((priority, tile))
+    return tiles
+
+
+def test_prefetch_queues_neighbours_then_locations(job):
+    job.prefetch(0.05, 0.05)
+
+    tiles = queued(job)
+
+    # not the visited tile itself, which update_app() ranks:
+    assert (1, (0, 0)) not in tiles
+    assert sorted(tile for _, tile in tiles[:8]) == [
+        (i, j) for i in (-1, 0, 1) for j in (-1, 0, 1) if (i, j) != (0, 0)
+    ]
+    assert [priority for priority, _ in tiles[:8]] == [1] * 8
+    assert tiles[8:] == [(2, (50, 50))]
+
+
+def test_prefetch_skips_ranked_and_queued_tiles(job):
+    rank_known(known([(1, 0.15, 0.15, 10)]), 0.15, 0.15)
+    job.prefetch(0.05, 0.05)
+    job.prefetch(0.05, 0.05)
+
+    tiles = [tile for _, tile in queued(job)]
+
+    assert (1, 1) not in tiles
+    assert len(tiles) == len(set(tiles)) == 8  # with the location's tile
+
+
+def test_nearer_visit_moves_a_tile_forward(job):
+    # the configured location's tile (50, 50) is next to a visited one:
+    job.prefetch(5.005, 4.905)
+
+    tiles = queued(job)
+
+    assert (1, (50, 50)) in tiles
+    assert (2, (50, 50)) not in tiles
+
+
+def test_run_ranks_queued_tiles(job, monkeypatch):
+    ranked = []
+    monkeypatch.setattr(hot_articles, "rank_tile", ranked.append)
+    job._put((1, 2), priority=1)
+    job._put((3, 4), priority=2)
+    job._put((1, 2), priority=3)  # queued already, nearer
+
+    thread = hot_articles.threading.Thread(
+        target=HotArticlesJob._run, args=(job,), daemon=True
+    )
+    thread.start()
+    job._queue.join()
+
+    assert ranked == [(1, 2), (3, 4)]
+    assert job._queued == {}
@@ -0,0 +1,146 @@
+import numpy as np
+import pytest
+
+from wikimap.src.pageview_store import PageviewStore
+
+
+PAGE = 4711
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PageviewStore(n_days=8, capacity=2, directory=tmp_path)
+
+
+def daily(first, last):
+    """
+    Views of day d are d + 1, so sums tell which days were counted.
+    """
+    return {day: day + 1 for day in range(first, last + 1)}
+
+
+def test_days_missing(store):
+    assert store.days_missing([PAGE], today=20) == {PAGE: 8}
+
+    store.update(PAGE, daily(15, 19), today=20)
+    assert store.days_missing([PAGE], today=20) == {}
+    assert store.days_missing([PAGE], today=22) == {PAGE: 3}
+    assert store.days_missing([PAGE], today=40) == {PAGE: 8}
+
+
+def test_page_without_data_counts_as_checked(store):
+    store.update(PAGE, {}, today=20)
+
+    assert store.days_missing([PAGE], today=20) == {}
+    assert store.window_sum([PAGE], days=8, today=20)[PAGE] == 0
+
+
+def test_ring_buffer_wraps(store):
+    store.update(PAGE, daily(0, 7), today=8)
+    # days 8..10 go to the slots of days 0..2:
+    store.update(PAGE, daily(8, 10), today=11)
+
+    row = store._rows[PAGE]
+    assert store._first_day[row] == 3
+    assert store._last_day[row] == 10
+    assert store._views[row].tolist() == [9, 10, 11, 4, 5, 6, 7, 8]
+
+    assert store.window_sum([PAGE], days=8, today=11)[PAGE] == sum(range(4, 12))
+    assert store.window_sum([PAGE], days=3, today=11)[PAGE] == 9 + 10 + 11
+
+
+def test_gap_resets_row(store):
+    store.update(PAGE, daily(0, 3), today=4)
+    # days 4..9 never arrived, so days 0..3 can't be continued:
+    store.update(PAGE, daily(10, 11), today=12)
+
+    row = store._rows[PAGE]
+    assert store._first_day[row] == 10
+    assert store._last_day[row] == 11
+    assert store._views[row].sum() == 11 + 12
+
+    assert store.window_sum([PAGE], days=8, today=12)[PAGE] == 11 + 12
+
+
+def test_adjacent_update_keeps_row(store):
+    store.update(PAGE, daily(0, 3), today=4)
+    store.update(PAGE, daily(4, 5), today=6)
+
+    assert store._first_day[store._rows[PAGE]] == 0
+    assert store.window_sum([PAGE], days=6, today=6)[PAGE] == sum(range(1, 7))
+
+
+def test_window_masks_days_outside_coverage(store):
+    store.update(PAGE, daily(0, 10), today=11)
+
+    # days 11 and 12 map to the slots still holding days 3 and 4:
+    window, covered = store._window([PAGE], days=8, today=13)
+    assert window.tolist() == [[6, 7, 8, 9, 10, 11, 0, 0]]
+    assert covered.tolist() == [[True] * 6 + [False] * 2]
+
+    # all of days 12..19 are after the last day with data:
+    assert store._window([PAGE], days=8, today=20)[0].sum() == 0
+
+    # days before the first covered day (3) are masked, too:
+    row = store._rows[PAGE]
+    assert store._views[row, 2 % 8] == 11  # day 10, sharing day 2's slot
+    window, covered = store._window([PAGE], days=3, today=4)
+    assert window.tolist() == [[0, 0, 4]]
+    assert covered.tolist() == [[False, False, True]]
+
+
+def test_window_is_capped_at_n_days(store):
+    store.update(PAGE, daily(0, 10), today=11)
+
+    assert store.window_sum([PAGE], days=30, today=11)[PAGE] == sum(range(4, 12))
+
+
+def test_rows_survive_growing(store):
+    pages = [1, 2, 3, 4, 5]
+    for page in pages:
+        store.update(page, {9: page}, today=10)
+
+    sums = store.window_sum(pages, days=8, today=10)
+    assert sums.tolist() == pages
+    assert sums.dtype == np.int64
+
+
+def test_covered_days(store):
+    store.update(PAGE, daily(5, 9), today=10)
+    store.update(PAGE + 1, {}, today=10)
+
+    covered = store.covered_days([PAGE, PAGE + 1], days=8, today=10)
+    assert covered.tolist() == [5, 0]
+    # a window longer than the store is capped at n_days:
+    assert store.covered_days([PAGE], days=90, today=12)[PAGE] == 5
+
+
+def test_partly_covered_sum_is_not_full(store):
+    full, partial = PAGE, PAGE + 1
+    store.update(full, {day: 10 for day in range(2, 10)}, today=10)
+    store.update(partial, {day: 10 for day in range(6, 10)}, today=10)
+
+    sums = store.window_sum([full, partial], days=8, today=10)
+    covered = store.covered_days([full, partial], days=8, today=10)
+    assert sums.tolist() == [80, 40]
+    assert (sums / covered).tolist() == [10, 10]
+
+
+def test_trend(store):
+    store.update(PAGE, daily(2, 9), today=10)
+
+    # (7 + 8 + 9 + 10) - (3 + 4 + 5 + 6):
+    assert store.trend([PAGE], days=8, today=10)[PAGE] == 16
+
+
+def test_trend_of_partly_covered_page(store):
+    flat, new, empty = PAGE, PAGE + 1, PAGE + 2
+    store.update(flat, {day: 10 for day in range(2, 10)}, today=10)
+    # same daily views, but only the later half and one day before it known:
+    store.update(new, {day: 10 for day in range(5, 10)}, today=10)
+    store.update(empty, {}, today=10)
+
+    trend = store.trend([flat, new, empty], days=8, today=10)
+    assert trend[flat] == 0
+    assert trend[new] == 0
+    assert np.isnan(trend[empty])
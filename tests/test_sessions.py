@@ -0,0 +1,145 @@
+import pandas as pd
+
+from wikimap.src import sessions, hot_articles
+
+
+def is_patch(figure):
+    return "__dash_patch_update" in figure
+
+
+def pan(update_app, previous, lon):
+    return update_app(
+        lon=lon,
+        session_id=previous["session.data"],
+        generation=previous["generation.data"],
+        location=previous["location.data"],
+    )
+
+
+def first_paint(app, monkeypatch, lon, previous):
+    """
+    Call first_paint() for a pan to lon, with articles 4 and 5 ranked hot.
+    """
+    hot_df = pd.DataFrame(
+        {
+            "title": ["Ort 4", "Ort 5"],
+            "lat": 0.0,
+            "lon": [0.04, 0.05],
+            "views": 2,
+            "log_views": 1.0,
+        },
+        index=pd.Index([4, 5], name="pageid"),
+    )
+    monkeypatch.setattr(hot_articles, "get_hot_articles", lambda lat, lon: hot_df)
+
+    client = app.test_client()
+    (output,) = [
+        dependency["output"]
+        for dependency in client.get("/_dash-dependencies").get_json()
+        if "viewport.data" in dependency["output"]
+    ]
+    relayout = {
+        "mapbox.center": {"lat": 0.0, "lon": lon},
+        "mapbox._derived": {
+            "coordinates": [[lon - 0.03, 0.01], [lon + 0.03, -0.01]]
+        },
+    }
+    response = client.post(
+        "/_dash-update-component",
+        json={
+            "output": output,
+            "outputs": [
+                {"id": component_id, "property": prop}
+                for component_id, prop in (
+                    part.split(".") for part in output.strip(".").split("...")
+                )
+            ],
+            "inputs": [{"id": "map", "property": "relayoutData", "value": relayout}],
+            "changedPropIds": ["map.relayoutData"],
+            "state": [{"id": "slider", "property": "value", "value": [0, 1]}]
+            + [
+                {"id": component_id, "property": "data", "value": previous[key]}
+                for component_id, key in [
+                    ("session", "session.data"),
+                    ("generation", "generation.data"),
+                    ("location", "location.data"),
+                ]
+            ],
+        },
+    )
+    assert response.status_code == 200
+    return response.get_json()["response"]
+
+
+def test_new_session():
+    session_id, session = sessions.load_session(None)
+
+    assert len(session_id) == 32
+    assert session == {"known": None, "sent": set(), "generation": None}
+
+
+def test_pan_sends_only_unsent_markers(update_app):
+    first = update_app(lon=0.0)
+    assert not is_patch(first["map.figure"])
+    shown = len(first["map.figure"]["data"][0]["lat"])
+
+    second = pan(update_app, first, 0.02)
+    assert is_patch(second["map.figure"])
+    assert second["generation.data"] != first["generation.data"]
+
+    # articles -3..3 are on the map already, only 4 and 5 are new in view:
+    assert shown == 7
+    operation = second["map.figure"]["operations"][0]
+    assert operation["location"] == ["data", 0, "lat"]
+    assert len(operation["params"]["value"]) == 2
+
+    _, session = sessions.load_session(second["session.data"])
+    assert session["sent"] == set(range(-3, 6))
+
+
+def test_dropped_response_leads_to_full_render(update_app):
+    first = update_app(lon=0.0)
+    dropped = pan(update_app, first, 0.01)
+    assert is_patch(dropped["map.figure"])
+
+    # the browser dropped that response, so it still has the first figure:
+    after = pan(update_app, first, 0.02)
+    assert not is_patch(after["map.figure"])
+
+    # and the next pan from the fully rendered figure is a delta again:
+    assert is_patch(pan(update_app, after, 0.03)["map.figure"])
+
+
+def test_overlapping_calls_lead_to_full_render(update_app):
+    first = update_app(lon=0.0)
+
+    # two pans start from the first figure; the second one's save wins, but
+    # the browser keeps the response of the first:
+    kept = pan(update_app, first, 0.01)
+    pan(update_app, first, 0.02)
+
+    after = pan(update_app, kept, 0.03)
+    assert not is_patch(after["map.figure"])
+
+
+def test_expired_session_leads_to_full_render(update_app):
+    first = update_app(lon=0.0)
+    sessions._store.clear()
+
+    after = pan(update_app, first, 0.02)
+    assert not is_patch(after["map.figure"])
+    assert after["session.data"] == first["session.data"]
+
+
+def test_first_paint_patches_only_an_up_to_date_map(app, update_app, monkeypatch):
+    first = update_app(lon=0.0)
+
+    painted = first_paint(app, monkeypatch, 0.02, first)
+    assert is_patch(painted["map"]["figure"])
+    assert painted["generation"]["data"] != first["generation.data"]
+
+    # the map missed that patch, so first_paint leaves it to update_app:
+    second = update_app(lon=0.0)
+    stale = first_paint(app, monkeypatch, 0.02, second | {"generation.data": "old"})
+    assert "map" not in stale
+    assert "generation" not in stale
@@ -0,0 +1,140 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from wikimap.src.spatial_index import SpatialIndex, bbox_from_relayout
+
+
+def articles(rows):
+    """
+    :param rows: list of (pageid, lat, lon, log_views)
+    """
+    pageids, lat, lon, log_views = zip(*rows)
+    viewdata = pd.DataFrame(
+        {
+            "title": [f"Ort {pageid}" for pageid in pageids],
+            "lat": lat,
+            "lon": lon,
+            "log_views": log_views,
+        },
+        index=pd.Index(pageids, name="pageid"),
+    )
+    viewdata["views"] = np.exp2(viewdata.log_views).round().astype(int)
+    return viewdata
+
+
+@pytest.fixture
+def index():
+    index = SpatialIndex(cell_size=1.0, capacity=2)
+    index.insert(
+        articles(
+            [
+                (1, 0.5, 0.5, 1.0),
+                (2, -0.5, -0.5, 2.0),  # cell (-1, -1)
+                (3, -1.5, 0.5, 3.0),  # cell (-2, 0)
+                (4, 0.9, 1.1, 4.0),  # cell (0, 1)
+                (5, 0.2, 0.8, 5.0),
+            ]
+        )
+    )
+    return index
+
+
+def query(index, bbox=None, view_range=None):
+    return sorted(index.query(bbox, view_range).tolist())
+
+
+def test_query_whole_index(index):
+    assert query(index) == [1, 2, 3, 4, 5]
+
+
+def test_query_bbox_across_negative_cells(index):
+    assert query(index, (-2.0, -1.0, 1.0, 1.0)) == [1, 2, 3, 5]
+    assert query(index, (-1.0, -1.0, 0.0, 0.0)) == [2]
+
+
+def test_query_partly_covered_border_cells(index):
+    # overlaps the cells of 1, 4 and 5, but contains only 5:
+    assert query(index, (0.1, 0.7, 0.3, 1.2)) == [5]
+    # same cells, a box that contains none of them:
+    assert query(index, (0.6, 0.6, 0.8, 0.9)) == []
+
+
+def test_query_bbox_bounds_are_inclusive(index):
+    assert query(index, (0.5, 0.5, 0.5, 0.5)) == [1]
+
+
+def test_query_view_range_is_inclusive(index):
+    assert query(index, view_range=(2.0, 4.0)) == [2, 3, 4]
+    assert query(index, view_range=(2.5, 3.5)) == [3]
+    assert query(index, (-2.0, -1.0, 1.0, 1.0), (3.0, 5.0)) == [3, 5]
+
+
+def test_query_box_spanning_more_cells_than_occupied(index):
+    assert query(index, (-90.0, -180.0, 90.0, 180.0)) == [1, 2, 3, 4, 5]
+
+
+def test_query_empty_index():
+    assert SpatialIndex().query((0, 0, 1, 1)).tolist() == []
+
+
+def test_new_ids(index):
+    assert index.new_ids([5, 6, 1, 7]) == [6, 7]
+    assert index.new_ids([]) == []
+
+
+def test_insert_skips_known_and_duplicate_ids(index):
+    index.insert(articles([(1, 10.0, 10.0, 9.0), (6, 0.1, 0.1, 1.0), (6, 0, 0, 1)]))
+
+    assert len(index) == 6
+    assert index.lookup([1]).lat.tolist() == [0.5]
+
+
+def test_update_views_resorts_cell(index):
+    cell = (0, 0)
+    assert index._sorted_cell(cell)[1].tolist() == [1.0, 5.0]
+
+    index.update_views(articles([(5, 0, 0, 0.5), (99, 0, 0, 7.0)]))
+
+    assert index._sorted_cell(cell)[1].tolist() == [0.5, 1.0]
+    assert query(index, view_range=(0.0, 0.9)) == [5]
+    assert index.lookup([5]).views.tolist() == [1]
+    assert 99 not in index
+
+
+def test_touch_and_frame(index):
+    index.touch([2, 4, 99], now=100.0)
+
+    frame = index.frame()
+    assert frame.index.tolist() == [1, 2, 3, 4, 5]
+    assert frame.last_seen.tolist() == [0, 100.0, 0, 100.0, 0]
+
+
+def test_pickle_then_insert(index):
+    index.touch([1], now=50.0)
+    restored = pickle.loads(pickle.dumps(index))
+
+    assert len(restored) == 5
+    assert query(restored, (0.0, 0.0, 1.0, 1.0)) == [1, 5]
+
+    # spare capacity was dropped, so this grows the arrays again:
+    restored.insert(articles([(6, 0.4, 0.4, 6.0), (7, 0.6, 0.6, 0.0)]))
+
+    assert query(restored, (0.0, 0.0, 1.0, 1.0)) == [1, 5, 6, 7]
+    assert query(restored, view_range=(5.5, 6.5)) == [6]
+    assert restored.frame().last_seen.tolist() == [50.0, 0, 0, 0, 0, 0, 0]
+    # the original is untouched:
+    assert len(index) == 5
+
+
+def test_bbox_from_relayout():
+    relayout = {
+        "mapbox._derived": {
+            "coordinates": [[13.3, 52.6], [13.5, 52.6], [13.5, 52.4], [13.3, 52.4]]
+        }
+    }
+    assert bbox_from_relayout(relayout) == (52.4, 13.3, 52.6, 13.5)
+    assert bbox_from_relayout({"autosize": True}) is None
+    assert bbox_from_relayout(None) is None
@@ -1,13 +1,12 @@
-import json
-import requests
-import pandas as pd
-import plotly.express as px
-from dash import Dash, html, dcc
-from dash.dependencies import Input, Output, State
-import numpy as np
-import re
-
-from .src.utils import render_histogram, get_or_extend_df, get_map, get_article_preview
+# Heavy modules (pandas, plotly.express, requests and everything under
+# .src.utils) are imported inside the callbacks, so that importing the
+# package and booting the server stay fast; the first callback pays for them.
+from .src.boot_timer import timed
+
+with timed("import dash"):
+    from dash import Dash, html, dcc, ctx, no_update
+    from dash.dependencies import Input, Output, State
+
 from .src.i18n import translate as t
 from .src.language_context import language_context
 from .config import current_language
@@ -19,27 +18,36 @@ def init_dashboard(
 
     language_context.set_language(current_language)
 
-    app = Dash(
-        __name__,
-        server=flask_app,
-        routes_pathname_prefix=route,
-    )
+    with timed("create Dash app"):
+        app = Dash(
+            __name__,
+            server=flask_app,
+            routes_pathname_prefix=route,
+            compress=True,  # gzip/brotli for callback responses (Flask-Compress)
+        )
 
     dash_bgcolor = "rgba(100,100,100, .8)"
 
-    # initialize the app with a first location and view:
-    point_collection_df = get_or_extend_df(
-        known_data=None,
-        lat=init_location["lat"],
-        lon=init_location["lon"],
-    )
+    # no network at boot: the initial call of update_app() starts the
+    # session and fetches the first location.
+    with timed("build layout"):
+        app.layout = _layout(init_location, dash_bgcolor)
+
+    with timed("register callbacks"):
+        init_callbacks(app)
 
-    app.layout = html.Div(
+    return app.server
+
+
+def _layout(init_location, dash_bgcolor):
+    return html.Div(
         [
-            dcc.Store(
-                id="known_entries",
-                data=point_collection_df.to_dict("records"),
-            ),
+            # id of the session's state on the server, see src/sessions.py:
+            dcc.Store(id="session", data=None),
+            # which figure (or patch) the map has last received:
+            dcc.Store(id="generation", data=None),
+            # relayoutData, passed on by first_paint() to update_app():
+            dcc.Store(id="viewport", data=None),
             dcc.Store(id="location", data=init_location),
             # Map background
             html.Div(
@@ -112,10 +120,6 @@ maximal 500 Artikel pro Aufruf.""")
         ]
     )
 
-    init_callbacks(app)
-
-    return app.server
-
 
 def init_callbacks(app):
 
@@ -130,61 +134,190 @@ def init_callbacks(app):
         """
         Article preview panel: updates upon click on a point on the map.
         """
+        from .src.utils import get_article_preview
+
         pageid = click_data["points"][0]["customdata"][2]
         article_preview = get_article_preview(pageid)
 
         return article_preview
 
+    @app.callback(
+        Output("map", "figure", allow_duplicate=True),
+        Output("generation", "data", allow_duplicate=True),
+        Output("viewport", "data"),
+        Input("map", "relayoutData"),
+        State("slider", "value"),
+        State("session", "data"),
+        State("generation", "data"),
+        State("location", "data"),
+        prevent_initial_call=True,
+    )
+    def first_paint(
+        relayout,
+        slider_std,
+        session_id,
+        generation,
+        location,
+    ):
+        """
+        Runs first on a pan: paints the precomputed most-viewed articles of
+        the new area at once, then hands the relayoutData on to update_app(),
+        which fetches the full set. Running one after the other, both see
+        which markers the map already has.
+        """
+        if relayout is None or "mapbox.center" not in relayout:
+            return no_update, no_update, relayout
+
+        from .src.utils import visible_articles, get_map_patch
+        from .src.spatial_index import SpatialIndex, bbox_from_relayout
+        from .src.sessions import load_session, save_session, new_generation
+        from .src.hot_articles import get_hot_articles, hot_articles_job
+
+        lat = relayout["mapbox.center"]["lat"]
+        lon = relayout["mapbox.center"]["lon"]
+        hot_articles_job.prefetch(lat, lon)
+
+        hot_df = get_hot_articles(lat, lon)
+        if hot_df is None or session_id is None or "max_log_views" not in location:
+            return no_update, no_update, relayout
+
+        # only patch the figure the session's "sent" describes; if the map
+        # missed a response, update_app() renders it in full:
+        session_id, session = load_session(session_id)
+        if session["known"] is None or generation != session.get("generation"):
+            return no_update, no_update, relayout
+
+        view_range = tuple(
+            map(lambda x: x * location["max_log_views"], slider_std)
+        )
+
+        # the same rule as update_app(), minus what the map already has:
+        hot_index = SpatialIndex()
+        hot_index.insert(hot_df)
+        visible_df = visible_articles(
+            hot_index, view_range, bbox=bbox_from_relayout(relayout)
+        )
+        unsent_df = visible_df.loc[~visible_df.index.isin(session["sent"])]
+        if len(unsent_df) == 0:
+            return no_update, no_update, relayout
+
+        session["sent"].update(unsent_df.index)
+        session["generation"] = new_generation()
+        save_session(session_id, session)
+
+        return get_map_patch(unsent_df), session["generation"], relayout
+
     @app.callback(
         Output("map", "figure"),  # the map
         Output("histogram", "figure"),  # the view number hist plot
-        Output("known_entries", "data"),  # updated known points
+        Output("session", "data"),
+        Output("generation", "data"),
+        Output("location", "data"),
         Input("slider", "value"),
-        Input("map", "relayoutData"),
-        State("known_entries", "data"),  # currently known points
+        Input("viewport", "data"),  # relayoutData, after first_paint()
+        State("session", "data"),  # id of the known points etc. on the server
+        State("generation", "data"),  # which figure the map has
         State("location", "data"),
     )
     def update_app(
         slider_std,  # list: [float, float]; range 0..1
         relayout,
-        points_json_pre,
+        session_id,
+        generation,
         location,
     ):
+        with timed("callback imports (first call)", once=True):
+            import numpy as np
+
+            from .src.utils import (
+                render_histogram,
+                get_or_extend_df,
+                evict_articles,
+                visible_articles,
+                get_map,
+                get_map_patch,
+            )
+            from .src.sessions import load_session, save_session, new_generation
+            from .src.spatial_index import bbox_from_relayout
+            from .src.hot_articles import hot_articles_job, rank_known
 
         if relayout is not None and relayout != {"autosize": True}:
             location["lat"] = relayout.get("mapbox.center").get("lat")
             location["lon"] = relayout.get("mapbox.center").get("lon")
 
-        # translate known data from JSON:
-        points_df_pre = pd.DataFrame(points_json_pre)
+        # the visible map area, if the map has reported one yet:
+        bbox = bbox_from_relayout(relayout)
+
+        # rank the tiles around this one in the background:
+        hot_articles_job.prefetch(location["lat"], location["lon"])
 
-        # add new points to df, update histogram data and filtering:
-        points_df_post = get_or_extend_df(
-            known_data=points_df_pre,
+        # the known points stay on the server (nothing known at first):
+        session_id, session = load_session(session_id)
+        known_pre = session["known"]
+
+        # add new points to the session's index of known ones:
+        known_post = get_or_extend_df(
+            known_data=known_pre,
             lat=location["lat"],
             lon=location["lon"],
         )
 
-        # absolute view numbers from standardized slider values:
-        view_range = tuple(
-            map(lambda x: x * np.max(points_df_post.log_views), slider_std)
+        # this tile's most-viewed articles, for first_paint() of later visits:
+        rank_known(known_post, location["lat"], location["lon"])
+
+        # the session's running max, which eviction must not lower, so that
+        # colors and slider positions keep their meaning:
+        prev_max_log_views = location.get("max_log_views")
+        max_log_views = max(
+            prev_max_log_views or 0, float(np.max(known_post.log_views, initial=0))
         )
 
-        # render the map:
-        fig = get_map(
-            points_df_post,
-            location,
-            view_range=view_range,
+        # keep the session within its memory budget:
+        n_post = len(known_post)
+        known_post = evict_articles(
+            known_post, location["lat"], location["lon"]
         )
+        evicted = len(known_post) < n_post
+
+        # absolute view numbers from standardized slider values:
+        view_range = tuple(map(lambda x: x * max_log_views, slider_std))
+
+        visible_df = visible_articles(known_post, view_range, bbox=bbox)
+
+        # a pan that leaves color scale, filter and the known set untouched
+        # only needs the markers the client doesn't have yet; the client
+        # merges them into the figure. That takes a map that has applied
+        # every response so far, see sessions.new_generation():
+        send_delta = (
+            ctx.triggered_id == "viewport"
+            and known_pre is not None
+            and not evicted
+            and max_log_views == prev_max_log_views
+            and generation is not None
+            and generation == session.get("generation")
+        )
+
+        if send_delta:
+            unsent_df = visible_df.loc[~visible_df.index.isin(session["sent"])]
+            fig = get_map_patch(unsent_df)
+            session["sent"].update(unsent_df.index)
+
+        else:
+            # render the map:
+            fig = get_map(visible_df, location, max_log_views=max_log_views)
+            session["sent"] = set(visible_df.index)
 
         # render the log view counts histogram:
         hist = render_histogram(
-            points_df_post,
+            known_post.frame(),
             bins=20,
             view_range=view_range,
         )
 
-        # translate df back to json for the Store:
-        points_json_post = points_df_post.to_dict("records")
+        session["known"] = known_post
+        session["generation"] = new_generation()
+        save_session(session_id, session)
+
+        location["max_log_views"] = max_log_views
 
-        return fig, hist, points_json_post
+        return fig, hist, session_id, session["generation"], location
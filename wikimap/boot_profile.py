@@ -0,0 +1,97 @@
+"""
+Report where the time goes when a worker starts:
+
+    python -m wikimap.boot_profile
+
+Runs the entry point in a fresh interpreter with -X importtime, then lists
+the packages wikimap's modules import, slowest first, and the boot steps
+recorded by boot_timer. Deferred imports (those the first callback pays
+for) are timed separately.
+"""
+import sys
+import subprocess
+from collections import defaultdict
+
+
+# the clock starts before anything of wikimap (which imports dash) is loaded:
+child_code = """
+import time
+
+start = time.perf_counter()
+import wikimap.wikimap
+print(f"Boot total: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+from wikimap.src.boot_timer import timed, boot_report
+
+with timed("deferred: callback imports"):
+    import wikimap.src.utils
+    import wikimap.src.hot_articles
+print(boot_report())
+"""
+
+
+def _import_tree(stderr):
+    """
+    Turn -X importtime output into a tree: a list of top-level imports,
+    each (name, self microseconds, cumulative microseconds, children).
+    Nested imports are indented below their parent and listed before it.
+    """
+    pending = defaultdict(list)  # level -> nodes still waiting for a parent
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        own, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue  # the header line
+
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        children = pending.pop(level + 1, [])
+        pending[level].append((name.strip(), int(own), int(cumulative), children))
+
+    return pending[0]
+
+
+def parse_importtime(stderr, top=15):
+    """
+    Sum the import time of what wikimap's own modules import, per package
+    (dash, pandas, plotly, ...); wikimap's modules count their own time only.
+    :return: list of (package, microseconds), slowest first
+    """
+    per_package = defaultdict(int)
+
+    def visit(node):
+        name, own, cumulative, children = node
+        package = name.split(".")[0]
+        if package != "wikimap":
+            per_package[package] += cumulative
+            return
+        per_package["wikimap (own modules)"] += own
+        for child in children:
+            visit(child)
+
+    for name, own, cumulative, children in _import_tree(stderr):
+        if name.split(".")[0] == "wikimap":
+            visit((name, own, cumulative, children))
+
+    return sorted(per_package.items(), key=lambda x: -x[1])[:top]
+
+
+def main():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", child_code],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr[-2000:], file=sys.stderr)
+        sys.exit(result.returncode)
+
+    print("Imports of wikimap's modules by package (incl. deferred ones):")
+    for package, microseconds in parse_importtime(result.stderr):
+        print(f"{microseconds / 1000:8.1f} ms  {package}")
+    print()
+    print(result.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,7 @@
+import os
+from pathlib import Path
+
+
 # i18n:
 language_codes = {
     "de": "DE",
@@ -5,7 +9,61 @@ language_codes = {
 }
 current_language = "de"
 
-url = {
+# WIKIMAP_API_URL points the app at another MediaWiki, e.g. the fake one
+# used by the load test:
+url = os.getenv("WIKIMAP_API_URL") or {
     "de": "https://de.wikipedia.org/w/api.php",
     "en": "https://en.wikipedia.org/w/api.php",
 }[current_language]
+
+# cache shared between worker processes; backend is "sqlite", "redis" or "none".
+# The SQLite file defaults to the user's cache dir (the installed package
+# directory is often read-only); values are unpickled, so it must not live
+# where other users can write, see SQLiteCache:
+cache_backend = os.getenv("WIKIMAP_CACHE_BACKEND", "sqlite")
+cache_path = os.getenv(
+    "WIKIMAP_CACHE_PATH",
+    str(
+        Path(os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache")
+        / "wikimap"
+        / "cache.sqlite"
+    ),
+)
+cache_lru_size = 4096
+redis_url = os.getenv("WIKIMAP_REDIS_URL", "redis://localhost:6379/0")
+
+# directory for the memory-mapped daily pageview matrix (None: system temp):
+pageview_store_dir = os.getenv("WIKIMAP_PAGEVIEW_DIR")
+
+# precomputed "hot articles" per tile, for the first paint of a new area:
+hot_tile_size = 0.1  # degrees
+hot_top_k = 50
+# the visited tile is ranked from what update_app() fetched anyway; the ones
+# within hot_prefetch_radius tiles of it, and those of hot_prefetch_locations,
+# are ranked ahead in the background. Each of those costs a geosearch and up
+# to 10 pageview requests, so the job waits hot_prefetch_pause seconds after
+# each. WIKIMAP_HOT_LOCATIONS is e.g. "52.52,13.40;48.14,11.58":
+hot_prefetch_radius = 1
+hot_prefetch_locations = [
+    tuple(map(float, location.split(",")))
+    for location in os.getenv("WIKIMAP_HOT_LOCATIONS", "").split(";")
+    if location.strip()
+]
+hot_prefetch_pause = 0.5  # seconds
+
+# per-session budget of known articles; beyond it, long unseen and far-away
+# articles are evicted. Articles seen within the same recency bucket (seconds)
+# count as equally recent, so that distance decides among them:
+session_max_articles = 5000
+session_recency_bucket = 600
+
+# what a session's map shows is kept server-side, keyed by an id in the
+# browser, so that callbacks don't upload it; expires after a day of
+# inactivity. Without a shared cache tier, each worker keeps up to
+# session_lru_size sessions in memory:
+session_ttl = 24 * 3600
+session_lru_size = 256
+
+# print the boot timings when wikimap.wikimap is imported (by every worker);
+# python -m wikimap.boot_profile reports them, too:
+print_boot_report = bool(os.getenv("WIKIMAP_BOOT_REPORT"))
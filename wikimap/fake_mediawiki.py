@@ -0,0 +1,206 @@
+"""
+A stand-in for the MediaWiki API, serving the few queries the app makes
+(geosearch, pageviews, pageimages|cirrusdoc, imageinfo) from a synthetic,
+deterministic world: one article roughly every 500 m, with stable
+pageids, titles and view counts. Used by the load test, so that it
+neither depends on nor hammers Wikipedia.
+
+    python -m wikimap.fake_mediawiki --port 8081
+"""
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from datetime import date, timedelta
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+# lattice spacing of the synthetic articles, in degrees:
+spacing = 0.005
+
+
+def _pageid(i, j):
+    return (i + 20000) * 100000 + (j + 40000)
+
+
+def _cell(pageid):
+    return pageid // 100000 - 20000, pageid % 100000 - 40000
+
+
+def _article(i, j):
+    """
+    The synthetic article of lattice cell (i, j): jittered position, title.
+    """
+    pageid = _pageid(i, j)
+    rng = random.Random(pageid)
+    lat = (i + rng.random()) * spacing
+    lon = (j + rng.random()) * spacing
+    return {
+        "pageid": pageid,
+        "ns": 0,
+        "title": f"Ort {pageid}",
+        "lat": lat,
+        "lon": lon,
+    }
+
+
+def _daily_views(pageid, days):
+    """
+    Heavy-tailed but stable daily views of an article over the last days.
+    """
+    rng = random.Random(pageid)
+    level = rng.lognormvariate(2.5, 1.5)
+    today = date.today()
+    return {
+        (today - timedelta(days=d)).isoformat(): int(level * rng.uniform(0.5, 1.5))
+        for d in range(days, 0, -1)
+    }
+
+
+def _distance(lat1, lon1, lat2, lon2):
+    """
+    Approximate distance in metres (equirectangular), good enough here.
+    """
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return 6371000 * math.hypot(x, y)
+
+
+def geosearch(lat, lon, radius, limit):
+    dlat = radius / 111000
+    dlon = radius / (111000 * max(math.cos(math.radians(lat)), 0.01))
+
+    lat_cells = range(
+        math.floor((lat - dlat) / spacing), math.ceil((lat + dlat) / spacing)
+    )
+    lon_cells = range(
+        math.floor((lon - dlon) / spacing), math.ceil((lon + dlon) / spacing)
+    )
+
+    found = []
+    for i in lat_cells:
+        for j in lon_cells:
+            article = _article(i, j)
+            dist = _distance(lat, lon, article["lat"], article["lon"])
+            if dist <= radius:
+                found.append(dict(article, dist=round(dist, 1), primary=""))
+
+    found.sort(key=lambda x: x["dist"])
+    return found[:limit]
+
+
+class FakeMediaWiki(ThreadingHTTPServer):
+    """
+    The server; counts the requests it answers per kind of query.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # clients hanging up, e.g. the app being shut down, are no error here:
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+    def count(self, kind):
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/w/api.php"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        time.sleep(self.server.latency)
+
+        if params.get("list") == "geosearch":
+            self.server.count("geosearch")
+            lat, lon = map(float, params["gscoord"].split("|"))
+            pages = geosearch(
+                lat, lon, float(params["gsradius"]), int(params["gslimit"])
+            )
+            body = {"batchcomplete": True, "query": {"geosearch": pages}}
+
+        elif params.get("prop") == "pageviews":
+            self.server.count("pageviews")
+            days = int(params["pvipdays"])
+            pages = []
+            for pageid in map(int, params["pageids"].split("|")):
+                article = _article(*_cell(pageid))
+                pages.append(
+                    {
+                        "pageid": pageid,
+                        "ns": 0,
+                        "title": article["title"],
+                        "pageviews": _daily_views(pageid, days),
+                    }
+                )
+            body = {"batchcomplete": True, "query": {"pages": pages}}
+
+        elif params.get("prop") == "pageimages|cirrusdoc":
+            self.server.count("preview")
+            pageid = int(params["pageids"])
+            title = _article(*_cell(pageid))["title"]
+            text = f"{title} ist ein Ort. " * 60
+            page = {
+                "pageid": pageid,
+                "title": title,
+                "cirrusdoc": [{"source": {"text": text}}],
+            }
+            body = {"batchcomplete": True, "query": {"pages": [page]}}
+
+        elif params.get("prop") == "imageinfo":
+            self.server.count("imageinfo")
+            body = {"query": {"pages": [{"imageinfo": [{"url": ""}]}]}}
+
+        else:
+            self.send_error(400, "query not supported by the fake MediaWiki")
+            return
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def start(port=0, latency=0.0) -> FakeMediaWiki:
+    """
+    Start the fake server in a background thread; port 0 picks a free one.
+    """
+    server = FakeMediaWiki(("127.0.0.1", port), latency=latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeMediaWiki(("127.0.0.1", args.port), latency=args.latency)
+    print(f"Fake MediaWiki at {server.url}")
+    server.serve_forever()
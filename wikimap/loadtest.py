@@ -0,0 +1,443 @@
+"""
+Load test: how many simultaneous panning users does one instance sustain?
+
+    python -m wikimap.loadtest --sessions 1,4,16,64 --steps 20
+
+Starts the fake MediaWiki, boots the app in a subprocess pointed at it, and
+replays realistic sessions against the Dash callback endpoint: an initial
+load, then pans (relayoutData, which fires first_paint and, chained to it,
+update_app), slider moves and clicks on markers (clickData). Each level of
+concurrent sessions reports throughput, tail latency per callback, bytes
+per request both ways (as sent over the wire, i.e. compressed), upstream
+calls per session, the app's memory growth per session (after a warm-up
+session, so that one-off setup isn't counted), the markers on each
+session's map, duplicates included, and how many pans first_paint could
+paint from a precomputed tile.
+"""
+import os
+import sys
+import time
+import socket
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+import statistics
+from pathlib import Path
+
+import requests
+
+from . import fake_mediawiki
+
+
+def serve(port):
+    """
+    Run the app on its own (this is what the subprocess does).
+    """
+    from flask import Flask
+    from . import init_dashboard
+
+    app = init_dashboard(Flask(__name__), route="/")
+    app.run(host="127.0.0.1", port=port, threaded=True)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_kb(pid):
+    """
+    Resident memory of a process in kB (Linux only; None elsewhere).
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def _apply_patch(value, patch):
+    """
+    Apply a Dash Patch response to the client's copy of a property, as the
+    renderer would. Only the operations the app uses are supported.
+    """
+    for operation in patch["operations"]:
+        target = value
+        for key in operation["location"][:-1]:
+            target = target[key]
+        location = operation["location"]
+
+        if operation["operation"] == "Extend":
+            target = target[location[-1]] if location else target
+            target.extend(operation["params"]["value"])
+        elif operation["operation"] == "Assign":
+            if location:
+                target[location[-1]] = operation["params"]["value"]
+            else:
+                value = operation["params"]["value"]
+
+    return value
+
+
+class DashClient:
+    """
+    Calls the app's callbacks over HTTP the way the Dash renderer does.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.http = requests.Session()
+
+        # callbacks by their set of inputs, e.g. {"map.clickData"}:
+        self.callbacks = {}
+        for dep in self.http.get(base_url + "_dash-dependencies").json():
+            inputs = frozenset(f"{i['id']}.{i['property']}" for i in dep["inputs"])
+            self.callbacks[inputs] = dep
+
+    @staticmethod
+    def _outputs(dep):
+        spec = dep["output"]
+        if spec.startswith(".."):
+            parts = spec[2:-2].split("...")
+        else:
+            parts = [spec]
+
+        outputs = []
+        for part in parts:
+            component_id, prop = part.split(".", 1)
+            outputs.append({"id": component_id, "property": prop})
+
+        return outputs if spec.startswith("..") else outputs[0]
+
+    def call(self, inputs, state, changed):
+        """
+        Fire the callback listening to `inputs` with the client's state.
+
+        :param inputs: set of "id.property" identifying the callback
+        :param state: dict "id.property" -> current value on the client
+        :param changed: list of "id.property" that triggered the call
+        :return: (seconds, request bytes, response bytes on the wire, dict
+            "id.property" -> new value, where Patch updates are still
+            unapplied)
+        """
+        dep = self.callbacks[frozenset(inputs)]
+
+        def values(items):
+            return [
+                {
+                    "id": i["id"],
+                    "property": i["property"],
+                    "value": state.get(f"{i['id']}.{i['property']}"),
+                }
+                for i in items
+            ]
+
+        payload = {
+            "output": dep["output"],
+            "outputs": self._outputs(dep),
+            "inputs": values(dep["inputs"]),
+            "changedPropIds": changed,
+            "state": values(dep["state"]),
+        }
+
+        start = time.perf_counter()
+        response = self.http.post(
+            self.base_url + "_dash-update-component", json=payload
+        )
+        seconds = time.perf_counter() - start
+
+        sent = len(response.request.body)
+        if response.status_code == 204:  # no_update
+            return seconds, sent, 0, {}
+        response.raise_for_status()
+
+        # response.content is decompressed already; the header has the size
+        # of the (compressed) body as transferred:
+        received = int(response.headers.get("Content-Length", len(response.content)))
+
+        updates = {
+            f"{component_id}.{prop}": value
+            for component_id, props in response.json()["response"].items()
+            for prop, value in props.items()
+        }
+
+        return seconds, sent, received, updates
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.errors = 0
+        # per session: (markers on the map, distinct pageids among them)
+        self.markers = []
+        # first_paint calls, and those that painted markers:
+        self.first_paints = 0
+        self.first_paint_hits = 0
+        self._lock = threading.Lock()
+
+    def record(self, callback, seconds, n_sent, n_received):
+        with self._lock:
+            self.latencies.setdefault(callback, []).append(seconds)
+            self.bytes_sent += n_sent
+            self.bytes_received += n_received
+
+    def record_first_paint(self, painted):
+        with self._lock:
+            self.first_paints += 1
+            self.first_paint_hits += painted
+
+    def record_map(self, figure):
+        trace = figure["data"][0] if figure and figure.get("data") else {}
+        pageids = [point[2] for point in trace.get("customdata", [])]
+        with self._lock:
+            self.markers.append((len(pageids), len(set(pageids))))
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+
+def run_session(base_url, seed, steps, think_time, stats):
+    """
+    One user: open the map somewhere in Germany, then pan around, move the
+    slider now and then, and click on markers.
+    """
+    client = DashClient(base_url)
+    rng = random.Random(seed)
+    lat = rng.uniform(47.5, 54.5)
+    lon = rng.uniform(6.5, 14.5)
+
+    state = {
+        "slider.value": [0, 1],
+        "map.relayoutData": None,
+        "map.clickData": None,
+        "session.data": None,
+        "generation.data": None,
+        "viewport.data": None,
+        "map.figure": None,
+        "location.data": {"lat": lat, "lon": lon},
+    }
+    update_app = {"slider.value", "viewport.data"}
+    first_paint = {"map.relayoutData"}
+    update_preview = {"map.clickData"}
+
+    def fire(name, inputs, changed):
+        try:
+            seconds, n_sent, n_received, updates = client.call(inputs, state, changed)
+        except requests.RequestException:
+            stats.error()
+            return
+        stats.record(name, seconds, n_sent, n_received)
+        if name == "first_paint":
+            stats.record_first_paint("map.figure" in updates)
+
+        # keep what the client has: Stores, and the figures patches apply to:
+        for key, value in updates.items():
+            if isinstance(value, dict) and "__dash_patch_update" in value:
+                if state.get(key) is None:
+                    continue
+                value = _apply_patch(state[key], value)
+            state[key] = value
+
+    # page load: the initial call of update_app:
+    fire("update_app", update_app, [])
+
+    for _ in range(steps):
+        time.sleep(rng.expovariate(1 / think_time) if think_time > 0 else 0)
+        action = rng.random()
+
+        if action < 0.7 or state["session.data"] is None:
+            # pan by a few km:
+            lat += rng.gauss(0, 0.03)
+            lon += rng.gauss(0, 0.05)
+            state["map.relayoutData"] = {
+                "mapbox.center": {"lat": lat, "lon": lon},
+                "mapbox.zoom": 15,
+                "mapbox._derived": {
+                    "coordinates": [
+                        [lon - 0.02, lat + 0.01],
+                        [lon + 0.02, lat + 0.01],
+                        [lon + 0.02, lat - 0.01],
+                        [lon - 0.02, lat - 0.01],
+                    ]
+                },
+            }
+            fire("first_paint", first_paint, ["map.relayoutData"])
+            fire("update_app", update_app, ["viewport.data"])
+
+        elif action < 0.85:
+            low = rng.choice([0, 0.2, 0.4])
+            state["slider.value"] = [low, rng.choice([0.8, 1])]
+            fire("update_app", update_app, ["slider.value"])
+
+        else:
+            # a marker near the centre: an article of the fake world there
+            pageid = fake_mediawiki._pageid(
+                int(lat // fake_mediawiki.spacing), int(lon // fake_mediawiki.spacing)
+            )
+            state["map.clickData"] = {
+                "points": [{"customdata": [f"Ort {pageid}", 0, pageid]}]
+            }
+            fire("update_preview", update_preview, ["map.clickData"])
+
+    stats.record_map(state["map.figure"])
+
+
+def _percentile(values, q):
+    if len(values) < 2:
+        return values[0] if values else float("nan")
+    # inclusive: stay within the observed values for small samples
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def run_level(base_url, n_sessions, steps, think_time, upstream, app_pid, level):
+    stats = Stats()
+
+    calls_before = upstream.total_calls()
+    rss_before = _rss_kb(app_pid)
+    start = time.perf_counter()
+
+    threads = [
+        threading.Thread(
+            target=run_session,
+            args=(base_url, level * 100000 + i, steps, think_time, stats),
+        )
+        for i in range(n_sessions)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    wall = time.perf_counter() - start
+    rss_after = _rss_kb(app_pid)
+    n_requests = sum(len(v) for v in stats.latencies.values())
+
+    print(f"\n=== {n_sessions} concurrent sessions, {steps} steps each ===")
+    print(f"throughput:        {n_requests / wall:8.1f} requests/s ({wall:.1f} s)")
+    print(f"errors:            {stats.errors:8d}")
+    print(
+        f"bytes on the wire: {stats.bytes_sent / max(n_requests, 1):8.0f} sent, "
+        f"{stats.bytes_received / max(n_requests, 1):.0f} received per request"
+    )
+    print(
+        f"upstream calls:    "
+        f"{(upstream.total_calls() - calls_before) / n_sessions:8.1f} per session"
+    )
+    if rss_before is not None and rss_after is not None:
+        print(
+            f"app memory growth: {(rss_after - rss_before) / n_sessions:8.0f} kB per "
+            f"session (RSS now {rss_after / 1024:.0f} MB)"
+        )
+    markers, distinct = zip(*stats.markers) if stats.markers else ((0,), (0,))
+    print(
+        f"map markers:       {statistics.mean(markers):8.0f} per session, "
+        f"{statistics.mean(markers) - statistics.mean(distinct):.0f} of them "
+        f"duplicates"
+    )
+    print(
+        f"first_paint hits:  {stats.first_paint_hits:8d} of {stats.first_paints} "
+        f"pans ({stats.first_paint_hits / max(stats.first_paints, 1):.0%})"
+    )
+    print("latency [ms]           n     p50     p95     p99     max")
+    for callback, latencies in sorted(stats.latencies.items()):
+        ms = [x * 1000 for x in latencies]
+        print(
+            f"  {callback:<16} {len(ms):5d} {_percentile(ms, 50):7.0f} "
+            f"{_percentile(ms, 95):7.0f} {_percentile(ms, 99):7.0f} {max(ms):7.0f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the wikimap app.")
+    parser.add_argument(
+        "--sessions",
+        default="1,4,16",
+        help="comma-separated numbers of concurrent sessions, one level each",
+    )
+    parser.add_argument("--steps", type=int, default=20, help="actions per session")
+    parser.add_argument(
+        "--think-time", type=float, default=0.5, help="mean seconds between actions"
+    )
+    parser.add_argument(
+        "--upstream-latency",
+        type=float,
+        default=0.05,
+        help="seconds the fake MediaWiki waits before answering",
+    )
+    parser.add_argument(
+        "--cache-backend", default="sqlite", choices=["sqlite", "redis", "none"]
+    )
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    upstream = fake_mediawiki.start(latency=args.upstream_latency)
+    workdir = tempfile.mkdtemp(prefix="wikimap-loadtest-")
+    port = _free_port()
+
+    env = dict(
+        os.environ,
+        WIKIMAP_API_URL=upstream.url,
+        WIKIMAP_CACHE_BACKEND=args.cache_backend,
+        WIKIMAP_CACHE_PATH=os.path.join(workdir, "cache.sqlite"),
+        WIKIMAP_PAGEVIEW_DIR=workdir,
+    )
+    app_process = subprocess.Popen(
+        [sys.executable, "-m", "wikimap.loadtest", "--serve", str(port)],
+        env=env,
+        cwd=Path(__file__).resolve().parents[1],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    try:
+        base_url = f"http://127.0.0.1:{port}/"
+        for _ in range(300):
+            try:
+                requests.get(base_url + "_dash-dependencies", timeout=1)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        else:
+            sys.exit("The app did not come up.")
+
+        print(f"App pid {app_process.pid}, fake MediaWiki at {upstream.url}")
+
+        # one unmeasured session first: the app imports most of its modules
+        # and sets up its caches on the first calls, which would otherwise
+        # count as the first level's memory growth:
+        run_session(base_url, -1, args.steps, 0, Stats())
+        rss = _rss_kb(app_process.pid)
+        if rss is not None:
+            print(f"Warmed up with one session, app RSS {rss / 1024:.0f} MB")
+
+        for level, n_sessions in enumerate(map(int, args.sessions.split(","))):
+            run_level(
+                base_url,
+                n_sessions,
+                args.steps,
+                args.think_time,
+                upstream,
+                app_process.pid,
+                level,
+            )
+
+    finally:
+        app_process.terminate()
+        app_process.wait()
+        upstream.shutdown()
+
+
+if __name__ == "__main__":
+    main()
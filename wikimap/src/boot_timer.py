@@ -0,0 +1,39 @@
+import time
+import logging
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+# label -> seconds spent, in the order the steps first ran:
+timings = {}
+
+
+@contextmanager
+def timed(label, once=False):
+    """
+    Measure a boot or first-use step and add its duration to `timings`.
+
+    :param once: only measure the first run of the step, e.g. imports in a
+        callback, which only the first call pays for
+    """
+    if once and label in timings:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[label] = timings.get(label, 0.0) + time.perf_counter() - start
+
+
+def boot_report() -> str:
+    """
+    Format the recorded timings as a small table, slowest step first.
+    """
+    lines = [
+        f"{seconds * 1000:8.1f} ms  {label}"
+        for label, seconds in sorted(timings.items(), key=lambda x: -x[1])
+    ]
+    return "\n".join(["Boot timings:"] + lines)
@@ -0,0 +1,314 @@
+import os
+import stat
+import time
+import pickle
+import sqlite3
+import logging
+import threading
+import functools
+import inspect
+from collections import OrderedDict
+from pathlib import Path
+
+from ..config import cache_backend, cache_path, cache_lru_size, redis_url
+
+
+logger = logging.getLogger(__name__)
+
+# sentinel for "not in cache", so that None can be cached as a value:
+MISSING = object()
+
+
+class LRUCache:
+    """
+    In-process tier: a bounded, thread-safe least-recently-used mapping.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key, MISSING)
+            if entry is MISSING:
+                return MISSING
+            value, expires = entry
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = None if ttl is None else time.time() + ttl
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def _check_private(path):
+    """
+    Raise PermissionError unless path is owned by this user and not
+    writable by group or others.
+    """
+    info = path.stat()
+    if info.st_uid != os.getuid():
+        raise PermissionError(f"{path} belongs to another user")
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f"{path} is writable by other users")
+
+
+class SQLiteCache:
+    """
+    Shared tier for workers on one host: a SQLite file in WAL mode, so that
+    readers in all processes don't block on a single writer. Expired rows are
+    deleted when read, and all of them every `purge_every` writes.
+
+    Values are pickled, so whoever can write the file can run code in the
+    app: its directory is created private, and a file or directory owned by
+    someone else, or writable by others, is refused with a PermissionError.
+    """
+
+    def __init__(self, path, purge_every=1000):
+        self.path = str(path)
+        self.purge_every = purge_every
+        self._writes = 0
+        self._local = threading.local()
+
+        directory = Path(self.path).resolve().parent
+        directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        for location in [directory, Path(self.path)]:
+            if location.exists():
+                _check_private(location)
+
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(key TEXT PRIMARY KEY, value BLOB, expires REAL)"
+        )
+
+    def _connection(self):
+        # one connection per thread and process (workers fork after import):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get_entry(self, key):
+        """
+        Return (value, expires), expires being a time.time() or None, or
+        MISSING.
+        """
+        row = (
+            self._connection()
+            .execute("SELECT value, expires FROM cache WHERE key = ?", (key,))
+            .fetchone()
+        )
+        if row is None:
+            return MISSING
+        value, expires = row
+        if expires is not None and expires < time.time():
+            self._connection().execute(
+                "DELETE FROM cache WHERE key = ? AND expires < ?", (key, time.time())
+            )
+            return MISSING
+        return pickle.loads(value), expires
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return MISSING if entry is MISSING else entry[0]
+
+    def set(self, key, value, ttl=None):
+        expires = None if ttl is None else time.time() + ttl
+        self._connection().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (key, pickle.dumps(value), expires),
+        )
+
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            self.purge()
+
+    def purge(self):
+        """
+        Delete all expired rows.
+        """
+        self._connection().execute(
+            "DELETE FROM cache WHERE expires < ?", (time.time(),)
+        )
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache")
+
+
+class RedisCache:
+    """
+    Shared tier for workers on several hosts. Speaks the Redis protocol, so
+    a local stand-in (e.g. a redis-server or KeyDB on localhost) serves too.
+    """
+
+    def __init__(self, url, prefix="wikimap:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError(
+                "The 'redis' cache backend needs the redis package: "
+                "pip install redis"
+            ) from e
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get_entry(self, key):
+        """
+        Return (value, expires), expires being a time.time() or None, or
+        MISSING.
+        """
+        pipeline = self._client.pipeline()
+        pipeline.get(self.prefix + key)
+        pipeline.pttl(self.prefix + key)
+        value, pttl = pipeline.execute()
+        if value is None:
+            return MISSING
+        # pttl is -1 for keys without expiry:
+        expires = None if pttl < 0 else time.time() + pttl / 1000
+        return pickle.loads(value), expires
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return MISSING if entry is MISSING else entry[0]
+
+    def set(self, key, value, ttl=None):
+        self._client.set(
+            self.prefix + key,
+            pickle.dumps(value),
+            ex=None if ttl is None else int(ttl),
+        )
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + "*"):
+            self._client.delete(key)
+
+
+class TieredCache:
+    """
+    Look up the in-process LRU first, then the shared tier; hits from the
+    shared tier are promoted into the LRU, for the time they have left there.
+    Writes go to both tiers, so one worker's fetch benefits all of them.
+    """
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not MISSING or self.shared is None:
+            return value
+
+        try:
+            entry = self.shared.get_entry(key)
+        except Exception as e:
+            logger.warning(f"Shared cache read failed: {e}")
+            return MISSING
+
+        if entry is MISSING:
+            return MISSING
+
+        value, expires = entry
+        ttl = None if expires is None else expires - time.time()
+        if ttl is None or ttl > 0:
+            self.local.set(key, value, ttl=ttl)
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.local.set(key, value, ttl=ttl)
+        if self.shared is None:
+            return
+
+        try:
+            self.shared.set(key, value, ttl=ttl)
+        except Exception as e:
+            logger.warning(f"Shared cache write failed: {e}")
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> TieredCache:
+    """
+    Return the process's cache, building it from config on first use.
+    """
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            local = LRUCache(maxsize=cache_lru_size)
+            if cache_backend == "sqlite":
+                try:
+                    shared = SQLiteCache(cache_path)
+                except (sqlite3.Error, OSError) as e:
+                    # e.g. a read-only or foreign location; cache in-process:
+                    logger.warning(
+                        f"SQLite cache at {cache_path} unavailable ({e}), "
+                        f"using the in-process cache only."
+                    )
+                    shared = None
+            elif cache_backend == "redis":
+                shared = RedisCache(redis_url)
+            elif cache_backend == "none":
+                shared = None
+            else:
+                raise ValueError(f"Unknown cache backend: {cache_backend}")
+
+            backend = cache_backend if shared is not None else "none"
+            logger.info(f"Cache: LRU({cache_lru_size}) + {backend}")
+            _cache = TieredCache(local, shared)
+
+    return _cache
+
+
+def cached(namespace, ttl=None):
+    """
+    Decorator: store a function's results in the shared cache, keyed by
+    namespace and the repr of its arguments (defaults included, so that e.g.
+    the API url is part of the key).
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = f"{namespace}:{tuple(bound.arguments.values())!r}"
+            cache = get_cache()
+
+            value = cache.get(key)
+            if value is MISSING:
+                value = func(*args, **kwargs)
+                cache.set(key, value, ttl=ttl)
+
+            return value
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,189 @@
+import time
+import queue
+import logging
+import itertools
+import threading
+
+import numpy as np
+import pandas as pd
+
+from ..config import (
+    url,
+    hot_tile_size,
+    hot_top_k,
+    hot_prefetch_radius,
+    hot_prefetch_locations,
+    hot_prefetch_pause,
+)
+from .cache import get_cache, MISSING
+from .utils import get_pagelist_around_location, query_viewcounts
+
+
+logger = logging.getLogger(__name__)
+
+
+def tile_of(lat, lon, tile_size=hot_tile_size):
+    """
+    The (row, col) of the tile a coordinate falls into.
+    """
+    return (int(np.floor(lat / tile_size)), int(np.floor(lon / tile_size)))
+
+
+def _tile_key(tile):
+    return f"hot:{url}:{hot_tile_size}:{tile[0]}:{tile[1]}"
+
+
+_columns = ["title", "lat", "lon", "views", "log_views"]
+
+
+def get_hot_articles(lat, lon):
+    """
+    Return the precomputed top-K articles of the tile around lat/lon, or
+    None if that tile hasn't been ranked yet. Never touches the network.
+    Result shape: df[["title", "lat", "lon", "views", "log_views"]]
+    """
+    ranking = get_cache().get(_tile_key(tile_of(lat, lon)))
+    if ranking is MISSING:
+        return None
+    return ranking
+
+
+def rank_tile(tile, top_k=hot_top_k):
+    """
+    Fetch all articles around the center of a tile and keep the top_k by
+    views. Stored in the shared cache, so that every worker can use it.
+    """
+    lat = (tile[0] + 0.5) * hot_tile_size
+    lon = (tile[1] + 0.5) * hot_tile_size
+
+    pagelist = get_pagelist_around_location(round(lat, 2), round(lon, 2))
+    ranking = pagelist.join(query_viewcounts(pagelist.index)).nlargest(
+        top_k, "views"
+    )
+    ranking["log_views"] = list(
+        map(lambda x: 0 if x == 0 else np.log2(x), ranking.views)
+    )
+
+    get_cache().set(_tile_key(tile), ranking, ttl=24 * 3600)
+    logger.info(f"Ranked tile {tile}: top {len(ranking)} articles.")
+
+    return ranking
+
+
+def rank_known(known_data, lat, lon, top_k=hot_top_k):
+    """
+    Rank the tile around lat/lon from a session's known articles, which
+    update_app() has just fetched and counted: no requests of its own. One
+    visit may not see all of a tile, so the result is merged into the
+    tile's ranking so far, which is only rewritten if its articles change.
+
+    :param known_data: SpatialIndex of a session's known articles
+    :return: the tile's ranking, or None if no known article is in it
+    """
+    tile = tile_of(lat, lon)
+    bbox = (
+        tile[0] * hot_tile_size,
+        tile[1] * hot_tile_size,
+        (tile[0] + 1) * hot_tile_size,
+        (tile[1] + 1) * hot_tile_size,
+    )
+    found = known_data.lookup(known_data.query(bbox))[_columns]
+
+    previous = get_hot_articles(lat, lon)
+    if previous is not None:
+        found = pd.concat([found, previous.loc[~previous.index.isin(found.index)]])
+    if len(found) == 0:
+        return None
+
+    ranking = found.nlargest(top_k, "views")
+    if previous is None or not ranking.index.sort_values().equals(
+        previous.index.sort_values()
+    ):
+        get_cache().set(_tile_key(tile), ranking, ttl=24 * 3600)
+
+    return ranking
+
+
+class HotArticlesJob:
+    """
+    Background thread ranking tiles ahead of time, so that panning into
+    them can paint their most-viewed articles right away. The tile a session
+    is in is ranked by update_app() from what it fetched (see rank_known());
+    this job ranks the ones around it, nearest first, and the configured
+    locations' tiles after those. It waits pause seconds after each tile, so
+    that sessions' own requests to the API come first.
+    """
+
+    def __init__(
+        self,
+        radius=hot_prefetch_radius,
+        locations=hot_prefetch_locations,
+        pause=hot_prefetch_pause,
+    ):
+        self.radius = radius
+        self.locations = locations
+        self.pause = pause
+        # (priority, sequence number, tile); lower priorities come first:
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        # tile -> priority it is queued with:
+        self._queued = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="hot-articles", daemon=True
+            )
+            self._thread.start()
+
+        for lat, lon in self.locations:
+            self._put(tile_of(lat, lon), priority=self.radius + 1)
+
+    def prefetch(self, lat, lon):
+        """
+        Queue the tiles around the one of lat/lon for ranking, by their
+        distance in tiles.
+        """
+        self.start()
+        row, col = tile_of(lat, lon)
+
+        for i in range(row - self.radius, row + self.radius + 1):
+            for j in range(col - self.radius, col + self.radius + 1):
+                ring = max(abs(i - row), abs(j - col))
+                if ring > 0:
+                    self._put((i, j), priority=ring)
+
+    def _put(self, tile, priority):
+        with self._lock:
+            if self._queued.get(tile, np.inf) <= priority:
+                return
+            if get_cache().get(_tile_key(tile)) is not MISSING:
+                return
+            # a tile queued further back is requeued; _run() skips the rest:
+            self._queued[tile] = priority
+        self._queue.put((priority, next(self._sequence), tile))
+
+    def _run(self):
+        while True:
+            priority, _, tile = self._queue.get()
+            with self._lock:
+                if self._queued.get(tile) != priority:
+                    self._queue.task_done()
+                    continue
+            try:
+                if get_cache().get(_tile_key(tile)) is MISSING:
+                    rank_tile(tile)
+                    time.sleep(self.pause)
+            except Exception as e:
+                logger.warning(f"Ranking tile {tile} failed: {e}")
+            finally:
+                with self._lock:
+                    self._queued.pop(tile, None)
+                self._queue.task_done()
+
+
+hot_articles_job = HotArticlesJob()
@@ -1,24 +1,43 @@
 import os
 import json
 import logging
+import functools
 from pathlib import Path
-
-import pandas as pd
-from dotenv import load_dotenv, find_dotenv
-import deepl
+from typing import TYPE_CHECKING
 
 from ..config import language_codes as code
 from .language_context import language_context
+from .cache import cached
+from .boot_timer import timed
 
+if TYPE_CHECKING:
+    import pandas as pd
 
-load_dotenv(find_dotenv(), override=True)
 logger = logging.getLogger(__name__)
 dashapp_rootdir = Path(__file__).resolve().parents[2]
-
-# make the dictionary available to the whole app, so not each and every
-# string that gets translated at app init triggers loading the json data:
 dictionary_path = dashapp_rootdir / "i18n" / "dictionary.json"
-multiling_dictionary = json.loads(dictionary_path.read_text())
+
+
+@functools.cache
+def load_env() -> None:
+    """
+    Read .env on first need of a secret rather than at import time.
+    """
+    from dotenv import load_dotenv, find_dotenv
+
+    with timed("load .env"):
+        load_dotenv(find_dotenv(), override=True)
+
+
+@functools.cache
+def get_multiling_dictionary() -> dict:
+    """
+    The dictionary, parsed once on first use, so not each and every string
+    that gets translated triggers loading the json data. Whoever writes the
+    file clears this cache.
+    """
+    with timed("parse dictionary.json"):
+        return json.loads(dictionary_path.read_text())
 
 
 def get_biling_dictionary(multiling_dictionary, language):
@@ -31,7 +50,7 @@ def get_biling_dictionary(multiling_dictionary, language):
     }
 
 
-def get_translations(labels: pd.Series) -> None:
+def get_translations(labels: "pd.Series") -> None:
     """
     Check voting labels for presence of their 'tgt_lang' translation in our
     dictionary, and if missing, translate them and store them right there.
@@ -53,8 +72,11 @@ def get_translations(labels: pd.Series) -> None:
 
     # do the translating and put it into the global dictionary:
     if new_labels:
+        load_env()
         auth_key = os.getenv("DEEPL_AUTH_KEY", None)
         if auth_key:
+            import deepl
+
             logger.info(f"Translating {len(new_labels)} new labels.")
             translator = deepl.Translator(auth_key)
             # new_entries: {"lorem": "ipsum", ...}
@@ -83,6 +105,7 @@ def get_translations(labels: pd.Series) -> None:
                 indent=4,
                 ensure_ascii=False,
             )
+            get_multiling_dictionary.cache_clear()
 
         else:
             logger.warning("No DeepL key found. Translations will not be available.")
@@ -142,11 +165,9 @@ def load_current_dict(current_language: str = "en") -> dict:
     Load the master dictionary, bring into simple form:
     {"lorem": {"en": "ipsum"}, ...} => {"lorem": "ipsum", ...}
     """
-    dictionary_path = dashapp_rootdir / "i18n" / "dictionary.json"
-
     tgt = code[current_language]
 
-    master_dict = json.loads(dictionary_path.read_text())
+    master_dict = get_multiling_dictionary()
     dictionary = {k: v[tgt] for k, v in master_dict.items()}
 
     return dictionary
@@ -162,9 +183,10 @@ def save_current_dict(dictionary, current_language: str = "en") -> None:
 
     master_dict = {k: {tgt: v} for k, v in dictionary.items()}
     json.dump(master_dict, open(dictionary_path, "w"), ensure_ascii=False, indent=4)
+    get_multiling_dictionary.cache_clear()
 
 
-def translate_series(series: pd.Series) -> pd.Series:
+def translate_series(series: "pd.Series") -> "pd.Series":
     """
     Translate a series of strings into the current language.
     """
@@ -219,6 +241,23 @@ def translate(text: str) -> str:
     return translated_text
 
 
+@cached("translation")
+def _deepl_translate(text: str, target_lang: str) -> str:
+    """
+    Translate text via DeepL. Results are kept in the shared cache, so that
+    several workers don't request the same string.
+    """
+    import deepl
+
+    translator = deepl.Translator(os.getenv("DEEPL_AUTH_KEY"))
+
+    return translator.translate_text(
+        text,
+        target_lang=target_lang,
+        source_lang="DE",
+    ).text
+
+
 def request_translation(text: str) -> str:
     """
     Query DeepL API for translation of text into current_language. Save the
@@ -226,6 +265,7 @@ def request_translation(text: str) -> str:
     """
     current_language = language_context.get_language()
 
+    load_env()
     auth_key = os.getenv("DEEPL_AUTH_KEY", None)
 
     if auth_key:
@@ -233,13 +273,7 @@ def request_translation(text: str) -> str:
             f"Requesting translation for '{text[0:30]}"
             f"{'[...]' if len(text) > 30 else ''}'"
         )
-        translator = deepl.Translator(auth_key)
-
-        translated_text = translator.translate_text(
-            text,
-            target_lang=code[current_language],
-            source_lang="DE",
-        ).text
+        translated_text = _deepl_translate(text, code[current_language])
 
     else:
         logger.warning("No DeepL key found. New translations will not be available.")
@@ -0,0 +1,211 @@
+import logging
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from ..config import pageview_store_dir
+
+
+logger = logging.getLogger(__name__)
+
+
+class PageviewStore:
+    """
+    Daily view counts per article, kept in a memory-mapped uint32 matrix
+    (one row per pageid, one column per day). The day axis is a ring buffer
+    over the last n_days days, addressed by date ordinal, so rows are filled
+    incrementally with just the days they're missing, and any window up to
+    n_days can be aggregated without asking the API again.
+    """
+
+    def __init__(self, n_days=128, capacity=1024, directory=None):
+        self.n_days = n_days
+        self.directory = directory
+        self._lock = threading.Lock()
+
+        # pageid -> row:
+        self._rows = {}
+        # per row: oldest and newest day (ordinal) with data, and the day
+        # the row was last brought up to date:
+        self._first_day = np.full(capacity, -1, dtype=np.int64)
+        self._last_day = np.full(capacity, -1, dtype=np.int64)
+        self._checked_day = np.full(capacity, -1, dtype=np.int64)
+        # the memmap's backing file is only created once a row is written:
+        self._views = None
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, pageid):
+        return pageid in self._rows
+
+    def _allocate(self, capacity):
+        return np.memmap(
+            tempfile.TemporaryFile(dir=self.directory),
+            dtype=np.uint32,
+            mode="w+",
+            shape=(capacity, self.n_days),
+        )
+
+    def _grow(self, needed):
+        if self._views is None:
+            self._views = self._allocate(len(self._first_day))
+
+        capacity = len(self._first_day)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+
+        views = self._allocate(capacity)
+        views[: len(self._rows)] = self._views[: len(self._rows)]
+        self._views = views
+
+        for name in ["_first_day", "_last_day", "_checked_day"]:
+            old = getattr(self, name)
+            new = np.full(capacity, -1, dtype=np.int64)
+            new[: len(old)] = old
+            setattr(self, name, new)
+
+    def _row(self, pageid):
+        row = self._rows.get(pageid)
+        if row is None:
+            row = len(self._rows)
+            self._grow(row + 1)
+            self._rows[pageid] = row
+        return row
+
+    def days_missing(self, pageids, today) -> dict:
+        """
+        For each pageid not yet checked today, the number of days (counted
+        back from today) that need fetching. Up-to-date pages are left out.
+        """
+        missing = {}
+        for pageid in pageids:
+            row = self._rows.get(pageid)
+            if row is not None and self._checked_day[row] >= today:
+                continue
+            if row is None or self._last_day[row] < 0:
+                missing[pageid] = self.n_days
+            else:
+                missing[pageid] = min(today - self._last_day[row], self.n_days)
+        return missing
+
+    def update(self, pageid, daily, today) -> None:
+        """
+        Write the daily view counts of one page into the store.
+
+        :param daily: dict {day ordinal: views}; days with no data yet are
+            simply absent
+        :param today: day ordinal of the fetch
+        """
+        with self._lock:
+            row = self._row(pageid)
+            self._checked_day[row] = today
+            if not daily:
+                return
+
+            days = np.fromiter(daily.keys(), dtype=np.int64)
+            views = np.fromiter(daily.values(), dtype=np.uint32)
+
+            last_day = self._last_day[row]
+            first_new = days.min()
+
+            # a gap between stored and new days can't be bridged, start over:
+            if last_day < 0 or first_new > last_day + 1:
+                self._views[row, :] = 0
+                self._first_day[row] = first_new
+
+            self._views[row, days % self.n_days] = views
+            self._last_day[row] = max(last_day, days.max())
+            self._first_day[row] = max(
+                self._first_day[row], self._last_day[row] - self.n_days + 1
+            )
+
+    def _window(self, pageids, days, today):
+        """
+        Daily views of the given pages over the `days` days before today,
+        as a (pages x days) matrix, and a boolean matrix of the same shape
+        telling which of those days the store has data for; days without
+        data count as 0 in the first.
+        """
+        rows = np.fromiter(
+            (self._rows[pageid] for pageid in pageids), dtype=np.int64
+        )
+        days = min(days, self.n_days)
+        day_axis = np.arange(today - days, today, dtype=np.int64)
+
+        window = np.asarray(
+            self._views[rows][:, day_axis % self.n_days], dtype=np.int64
+        )
+
+        # ring buffer slots outside a row's coverage hold stale days:
+        covered = (day_axis[np.newaxis, :] >= self._first_day[rows, np.newaxis]) & (
+            day_axis[np.newaxis, :] <= self._last_day[rows, np.newaxis]
+        )
+
+        return np.where(covered, window, 0), covered
+
+    def window_sum(self, pageids, days, today) -> pd.Series:
+        """
+        Sum of views per page over the `days` days before today. Days the
+        store has no data for add nothing, e.g. those beyond the 60 days
+        fetched for a new page: compare sums of long windows only together
+        with covered_days().
+        :return: pd.Series "views", indexed by pageid
+        """
+        pageids = list(pageids)
+        sums = self._window(pageids, days, today)[0].sum(axis=1)
+
+        return pd.Series(
+            sums, index=pd.Index(pageids, name="pageid"), name="views", dtype="int64"
+        )
+
+    def covered_days(self, pageids, days, today) -> pd.Series:
+        """
+        How many of the `days` days before today the store has data for,
+        per page.
+        :return: pd.Series "days", indexed by pageid
+        """
+        pageids = list(pageids)
+        covered = self._window(pageids, days, today)[1].sum(axis=1)
+
+        return pd.Series(
+            covered, index=pd.Index(pageids, name="pageid"), name="days", dtype="int64"
+        )
+
+    def trend(self, pageids, days, today) -> pd.Series:
+        """
+        Change in views per page: the later half of the window minus the
+        earlier half. Each half's views are averaged over the days it has
+        data for, then scaled to the half's length, so that a page covered
+        only partly isn't seen as rising; NaN where a half has no data.
+        :return: pd.Series "trend", indexed by pageid
+        """
+        pageids = list(pageids)
+        window, covered = self._window(pageids, days, today)
+        half = window.shape[1] // 2
+
+        def mean(views, days):
+            n_days = days.sum(axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return np.where(n_days > 0, views.sum(axis=1) / n_days, np.nan)
+
+        change = (
+            mean(window[:, half:], covered[:, half:])
+            - mean(window[:, :half], covered[:, :half])
+        ) * half
+
+        return pd.Series(
+            change,
+            index=pd.Index(pageids, name="pageid"),
+            name="trend",
+            dtype="float64",
+        )
+
+
+# one store per process; the matrix is backed by an unlinked temporary file
+# in pageview_store_dir, so the OS pages it in and out as needed.
+pageview_store = PageviewStore(directory=pageview_store_dir)
@@ -0,0 +1,78 @@
+import uuid
+import logging
+import threading
+
+from ..config import session_ttl, session_lru_size
+from .cache import LRUCache, get_cache, MISSING
+
+
+logger = logging.getLogger(__name__)
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _session_store():
+    """
+    Where session state lives: the shared cache tier, so that any worker
+    can serve any request of a session, or an LRU of its own if there is no
+    shared tier. Never the in-process tier of the shared cache, which would
+    hand out stale copies once another worker has moved the session on.
+    """
+    global _store
+
+    with _store_lock:
+        if _store is None:
+            _store = get_cache().shared or LRUCache(maxsize=session_lru_size)
+
+    return _store
+
+
+def new_session() -> dict:
+    """
+    State of a session that hasn't fetched anything yet:
+    - known: SpatialIndex of the articles fetched for it, or None
+    - sent: pageids of the markers on the map figure of `generation`
+    - generation: id of the latest figure or figure patch sent, or None
+    """
+    return {"known": None, "sent": set(), "generation": None}
+
+
+def new_generation() -> str:
+    """
+    A fresh id for a figure or figure patch. The browser keeps the id of
+    the last one it applied (the "generation" Store) and sends it back. If
+    that's not the session's, the browser has missed a response: e.g. the
+    Dash renderer drops the result of a callback that is re-triggered while
+    still running, or two calls for the session overlapped and only one
+    save survived. Then the server's "sent" can't be trusted, and the map
+    needs a full render. Random rather than counted, so that two calls
+    starting from the same generation don't end up with the same id.
+    """
+    return uuid.uuid4().hex[:16]
+
+
+def load_session(session_id) -> tuple:
+    """
+    Return (session_id, state); a new id for a new session, and fresh state
+    if the id is unknown, e.g. because its state expired.
+    """
+    if session_id is None:
+        return uuid.uuid4().hex, new_session()
+
+    try:
+        session = _session_store().get(f"session:{session_id}")
+    except Exception as e:
+        logger.warning(f"Reading session {session_id} failed: {e}")
+        session = MISSING
+
+    if session is MISSING:
+        return session_id, new_session()
+    return session_id, session
+
+
+def save_session(session_id, session) -> None:
+    try:
+        _session_store().set(f"session:{session_id}", session, ttl=session_ttl)
+    except Exception as e:
+        logger.warning(f"Saving session {session_id} failed: {e}")
@@ -0,0 +1,301 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+
+class SpatialIndex:
+    """
+    In-memory index over the articles a session has fetched so far; it is
+    kept with the session's state, so it is bounded by the session budget
+    (see evict_articles()).
+
+    Articles are bucketed into a regular lat/lon grid; inside each cell they
+    are kept sorted by log_views, so "articles in this bounding box within
+    this view range" only touches the cells overlapping the box and, within
+    each of them, a binary-searched slice. Membership ("which of these
+    pageids are new?") is a hash lookup.
+    """
+
+    # the columnar arrays, one entry per row:
+    _columns = [
+        "_pageid",
+        "_lat",
+        "_lon",
+        "_views",
+        "_log_views",
+        "_title",
+        "_last_seen",
+    ]
+
+    def __init__(self, cell_size=0.05, capacity=1024):
+        self.cell_size = cell_size
+
+        # pageid -> row in the columnar arrays below:
+        self._rows = {}
+        self._size = 0
+        self._pageid = np.empty(capacity, dtype=np.int64)
+        self._lat = np.empty(capacity, dtype=np.float64)
+        self._lon = np.empty(capacity, dtype=np.float64)
+        self._views = np.empty(capacity, dtype=np.int64)
+        self._log_views = np.empty(capacity, dtype=np.float64)
+        self._title = np.empty(capacity, dtype=object)
+        # when the session last had the article in its surroundings:
+        self._last_seen = np.empty(capacity, dtype=np.float64)
+
+        # (cell_lat, cell_lon) -> list of rows; sorted copies are rebuilt
+        # lazily for cells that received new rows since the last query:
+        self._cells = {}
+        self._sorted = {}
+        self._dirty = set()
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, pageid):
+        return pageid in self._rows
+
+    def __getstate__(self):
+        # pickled with the session: leave out spare capacity and the sorted
+        # cells, which are rebuilt on the next query
+        state = self.__dict__.copy()
+        for name in self._columns:
+            state[name] = state[name][: self._size]
+        state["_sorted"] = {}
+        state["_dirty"] = set(self._cells)
+        return state
+
+    def _grow(self, needed):
+        capacity = max(len(self._pageid), 1)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in self._columns:
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[: self._size] = old[: self._size]
+            setattr(self, name, new)
+
+    def _cell(self, lat, lon):
+        return (
+            int(np.floor(lat / self.cell_size)),
+            int(np.floor(lon / self.cell_size)),
+        )
+
+    def new_ids(self, pageids) -> list:
+        """
+        Return those of the given pageids that are not in the index yet.
+        """
+        return [pageid for pageid in pageids if pageid not in self._rows]
+
+    @property
+    def log_views(self) -> np.ndarray:
+        return self._log_views[: self._size]
+
+    def insert(self, viewdata: pd.DataFrame) -> None:
+        """
+        Add articles to the index. Already known pageids are skipped, which
+        costs a hash lookup per row, so pass only rows that are likely new.
+
+        :param viewdata: df[["title", "lat", "lon", "views", "log_views"]],
+            indexed by pageid, optionally with a "last_seen" column
+        """
+        is_new = [pageid not in self._rows for pageid in viewdata.index]
+        viewdata = viewdata.loc[is_new]
+        viewdata = viewdata.loc[~viewdata.index.duplicated()]
+        n = len(viewdata)
+        if n == 0:
+            return
+
+        start = self._size
+        self._grow(start + n)
+        stop = start + n
+
+        self._pageid[start:stop] = viewdata.index.to_numpy(dtype=np.int64)
+        self._lat[start:stop] = viewdata.lat.to_numpy(dtype=np.float64)
+        self._lon[start:stop] = viewdata.lon.to_numpy(dtype=np.float64)
+        self._views[start:stop] = viewdata.views.fillna(0).to_numpy(dtype=np.int64)
+        self._log_views[start:stop] = (
+            viewdata.log_views.fillna(0).to_numpy(dtype=np.float64)
+        )
+        self._title[start:stop] = viewdata.title.to_numpy(dtype=object)
+        if "last_seen" in viewdata:
+            self._last_seen[start:stop] = viewdata.last_seen.to_numpy(dtype=np.float64)
+        else:
+            self._last_seen[start:stop] = 0
+
+        cell_lat = np.floor(self._lat[start:stop] / self.cell_size).astype(np.int64)
+        cell_lon = np.floor(self._lon[start:stop] / self.cell_size).astype(np.int64)
+
+        for row, pageid, clat, clon in zip(
+            range(start, stop), self._pageid[start:stop], cell_lat, cell_lon
+        ):
+            self._rows[int(pageid)] = row
+            cell = (int(clat), int(clon))
+            self._cells.setdefault(cell, []).append(row)
+            self._dirty.add(cell)
+
+        self._size = stop
+        logger.debug(f"SpatialIndex: {n} articles added, {self._size} total.")
+
+    def _sorted_cell(self, cell):
+        """
+        Rows of one cell and their log_views, both sorted by log_views.
+        """
+        if cell in self._dirty or cell not in self._sorted:
+            rows = np.asarray(self._cells[cell], dtype=np.int64)
+            order = np.argsort(self._log_views[rows], kind="stable")
+            rows = rows[order]
+            self._sorted[cell] = (rows, self._log_views[rows])
+            self._dirty.discard(cell)
+
+        return self._sorted[cell]
+
+    def query(self, bbox=None, view_range=None) -> np.ndarray:
+        """
+        Return the pageids of all indexed articles inside the bounding box
+        whose log_views lie within view_range (both bounds inclusive).
+
+        :param bbox: tuple(lat_min, lon_min, lat_max, lon_max), or None for
+            the whole index
+        :param view_range: tuple(float, float) of log_views, or None
+        """
+        if view_range is None:
+            view_range = (-np.inf, np.inf)
+
+        if bbox is None:
+            cells = list(self._cells)
+        else:
+            lat_min, lon_min, lat_max, lon_max = bbox
+            lat0, lon0 = self._cell(lat_min, lon_min)
+            lat1, lon1 = self._cell(lat_max, lon_max)
+            n_cells = (lat1 - lat0 + 1) * (lon1 - lon0 + 1)
+
+            # a zoomed-out box may span more cells than are occupied:
+            if n_cells > len(self._cells):
+                cells = [
+                    c
+                    for c in self._cells
+                    if lat0 <= c[0] <= lat1 and lon0 <= c[1] <= lon1
+                ]
+            else:
+                cells = [
+                    (i, j)
+                    for i in range(lat0, lat1 + 1)
+                    for j in range(lon0, lon1 + 1)
+                    if (i, j) in self._cells
+                ]
+
+        hits = []
+        for cell in cells:
+            rows, log_views = self._sorted_cell(cell)
+            lo = np.searchsorted(log_views, view_range[0], side="left")
+            hi = np.searchsorted(log_views, view_range[1], side="right")
+            hits.append(rows[lo:hi])
+
+        if not hits:
+            return np.empty(0, dtype=np.int64)
+
+        rows = np.concatenate(hits)
+
+        # cells on the border of the box are only partly inside:
+        if bbox is not None:
+            inside = (
+                (self._lat[rows] >= lat_min)
+                & (self._lat[rows] <= lat_max)
+                & (self._lon[rows] >= lon_min)
+                & (self._lon[rows] <= lon_max)
+            )
+            rows = rows[inside]
+
+        return self._pageid[rows]
+
+    def update_views(self, viewdata: pd.DataFrame) -> None:
+        """
+        Refresh views and log_views of those articles in viewdata that are
+        indexed; cells whose order changes get re-sorted on the next query.
+
+        :param viewdata: df[["views", "log_views"]], indexed by pageid
+        """
+        viewdata = viewdata.loc[[pageid in self._rows for pageid in viewdata.index]]
+        rows = np.fromiter(
+            (self._rows[pageid] for pageid in viewdata.index), dtype=np.int64
+        )
+        log_views = viewdata.log_views.to_numpy(dtype=np.float64)
+
+        changed = self._log_views[rows] != log_views
+        rows = rows[changed]
+        self._views[rows] = viewdata.views.to_numpy(dtype=np.int64)[changed]
+        self._log_views[rows] = log_views[changed]
+
+        for row in rows:
+            self._dirty.add(self._cell(self._lat[row], self._lon[row]))
+
+    def touch(self, pageids, now) -> None:
+        """
+        Set last_seen of those of the given pageids that are indexed.
+        """
+        rows = [self._rows[pageid] for pageid in pageids if pageid in self._rows]
+        self._last_seen[rows] = now
+
+    def frame(self) -> pd.DataFrame:
+        """
+        All indexed articles, in the order they were inserted.
+        Result shape: df[["title", "lat", "lon", "views", "log_views",
+        "last_seen"]]
+        """
+        size = self._size
+        return pd.DataFrame(
+            {
+                "title": self._title[:size],
+                "lat": self._lat[:size],
+                "lon": self._lon[:size],
+                "views": self._views[:size],
+                "log_views": self._log_views[:size],
+                "last_seen": self._last_seen[:size],
+            },
+            index=pd.Index(self._pageid[:size], name="pageid"),
+        )
+
+    def lookup(self, pageids) -> pd.DataFrame:
+        """
+        Return the indexed data for the given (known) pageids.
+        Result shape: df[["title", "lat", "lon", "views", "log_views"]]
+        """
+        rows = np.fromiter(
+            (self._rows[pageid] for pageid in pageids), dtype=np.int64
+        )
+
+        return pd.DataFrame(
+            {
+                "title": self._title[rows],
+                "lat": self._lat[rows],
+                "lon": self._lon[rows],
+                "views": self._views[rows],
+                "log_views": self._log_views[rows],
+            },
+            index=pd.Index(self._pageid[rows], name="pageid"),
+        )
+
+
+def bbox_from_relayout(relayout):
+    """
+    Extract the visible map area from a relayoutData dict, if it contains one.
+
+    :return: tuple(lat_min, lon_min, lat_max, lon_max) or None
+    """
+    if not relayout:
+        return None
+
+    derived = relayout.get("mapbox._derived")
+    if derived is None or "coordinates" not in derived:
+        return None
+
+    # four [lon, lat] corners of the viewport:
+    lons, lats = zip(*derived["coordinates"])
+
+    return (min(lats), min(lons), max(lats), max(lons))
@@ -1,17 +1,27 @@
 import requests
 import json
 import re
+import time
+from datetime import date
 from textwrap import shorten
 
 import numpy as np
 import pandas as pd
 import plotly.express as px
 from plotly.graph_objects import Figure
-from dash import html
-
-from ..config import url, current_language
+from dash import html, Patch
+
+from ..config import (
+    url,
+    current_language,
+    session_max_articles,
+    session_recency_bucket,
+)
 from .i18n import translate as t
 from .language_context import language_context
+from .spatial_index import SpatialIndex
+from .cache import cached, get_cache, MISSING
+from .pageview_store import pageview_store
 
 
 colorscale = [
@@ -25,6 +35,7 @@ colorscale = [
 ]
 
 
+@cached("geosearch", ttl=24 * 3600)
 def get_pagelist_around_location(
     lat, lon, radius=10000, gslimit=500, url=url
 ) -> pd.DataFrame:
@@ -50,8 +61,12 @@ def get_pagelist_around_location(
     return pagelist.set_index("pageid")
 
 
-def api_request(ids, days, url=url):
-
+def api_request(ids, days, url=url) -> dict:
+    """
+    Get the daily views of up to 50 pages over the last `days` days.
+    :return: dict {pageid: {day ordinal: views}}; days the API has no
+        numbers for yet are left out
+    """
     page_id_str = "|".join(map(str, ids[0:50]))
 
     query_params = {
@@ -64,17 +79,16 @@ def api_request(ids, days, url=url):
     }
     response = requests.get(url, params=query_params)
     response_dict = json.loads(response.text)
-    response_df = pd.json_normalize(response_dict["query"]["pages"])
-
-    # shape of df: col 0-2 identifies page, 30 more cols are daily views
-
-    views = response_df.iloc[:, 0:3]
 
-    # sum all daily columns:
-    views["views"] = response_df.filter(regex="pageviews").sum(axis=1)
-    views.set_index("pageid", inplace=True)
+    daily_views = {}
+    for page in response_dict["query"]["pages"]:
+        daily_views[page["pageid"]] = {
+            date.fromisoformat(day).toordinal(): views
+            for day, views in (page.get("pageviews") or {}).items()
+            if views is not None
+        }
 
-    return views["views"]
+    return daily_views
 
 
 def _shorten(ls, chunksize=50):
@@ -84,65 +98,153 @@ def _shorten(ls, chunksize=50):
         return []
 
 
-def query_viewcounts(ids, days=30):
+def _request_viewcounts(ids, days):
     """
     Split API requests into chunks of 50 page IDs.
     [TODO: why?]
-    :return: df[["pageid", "title", "views"]]
     """
-    page_views = api_request(ids[0:50], days=days)
+    daily_views = api_request(ids[0:50], days=days)
     ids = _shorten(ids)
 
     while len(ids) > 0:
-        chunk = api_request(ids, days=days)
-        page_views = pd.concat([page_views, chunk], axis=0)
+        daily_views.update(api_request(ids, days=days))
         ids = _shorten(ids)
 
-    return page_views
+    return daily_views
 
 
-def get_or_extend_df(known_data, lat, lon, radius=10000, gslimit=500):
+def query_viewcounts(ids, days=30):
+    """
+    Get view sums per page over the last `days` days from the pageview
+    store. Pages the store isn't up to date on are filled in first, with
+    only the days they're missing; those come from the shared cache if
+    another worker fetched them today, else from the API. The API goes
+    back 60 days at most, so longer windows are only partly covered for
+    pages new to the store (see PageviewStore.covered_days()).
+    :return: pd.Series "views", indexed by pageid
+    """
+    cache = get_cache()
+    today = date.today().toordinal()
+
+    # group stale pages by how many days they need, up to the API's limit:
+    to_fetch = {}
+    for pageid, n_days in pageview_store.days_missing(ids, today).items():
+        n_days = min(n_days, 60)
+        daily = cache.get(f"pageviews:{url}:{today}:{n_days}:{pageid}")
+        if daily is MISSING:
+            to_fetch.setdefault(n_days, []).append(pageid)
+        else:
+            pageview_store.update(pageid, daily, today)
+
+    for n_days, missing_ids in to_fetch.items():
+        for pageid, daily in _request_viewcounts(missing_ids, days=n_days).items():
+            cache.set(
+                f"pageviews:{url}:{today}:{n_days}:{pageid}", daily, ttl=24 * 3600
+            )
+            pageview_store.update(pageid, daily, today)
+
+        # pages the API didn't return at all still count as checked:
+        for pageid in missing_ids:
+            if pageid not in pageview_store:
+                pageview_store.update(pageid, {}, today)
+
+    return pageview_store.window_sum(ids, days, today)
 
-    if known_data is None:  # start new df
-        pagelist = get_pagelist_around_location(lat, lon, radius)
-        viewdata = pagelist.join(query_viewcounts(pagelist.index))
-        viewdata["log_views"] = list(
-            map(lambda x: 0 if x == 0 else np.log2(x), viewdata.views)
-        )
 
-        return viewdata
+def _with_viewcounts(pagelist) -> pd.DataFrame:
+    """
+    Attach view counts to a pagelist.
+    Result shape: df[["title", "lat", "lon", "views", "log_views"]]
+    """
+    viewdata = pagelist.join(query_viewcounts(pagelist.index))
+    viewdata["log_views"] = list(
+        map(lambda x: 0 if x == 0 else np.log2(x), viewdata.views)
+    )
+
+    return viewdata
+
+
+def get_or_extend_df(known_data, lat, lon, radius=10000, gslimit=500) -> SpatialIndex:
+    """
+    Add the articles around lat/lon to a session's known articles, and mark
+    them as just seen.
+
+    :param known_data: SpatialIndex of the known articles, extended in
+        place; None starts a new one
+    :return: the SpatialIndex
+    """
+    now = time.time()
+
+    # snap to a ~1 km grid, so that nearby views share one cached geosearch:
+    lat, lon = round(lat, 2), round(lon, 2)
 
-    # add new articles:
     new_pagelist = get_pagelist_around_location(
         lat, lon, radius=radius, gslimit=gslimit
     )
 
-    # don't query viewcount for known pages:
-    new_pagelist_filtered = new_pagelist.loc[
-        new_pagelist.index.difference(known_data.index)
-    ]
-    if len(new_pagelist_filtered) == 0:
-        return known_data
+    if known_data is None:  # start new index
+        known_data = SpatialIndex()
 
-    else:
-        new_data = new_pagelist_filtered.join(
-            query_viewcounts(new_pagelist_filtered.index)
-        )
-        new_data["log_views"] = list(
-            map(lambda x: 0 if x == 0 else np.log2(x), new_data.views)
-        )
-        viewdata = pd.concat([known_data, new_data])
+    # view counts of everything around here, so that known articles don't
+    # keep the numbers of the day they were first fetched; the pageview
+    # store only asks the API for days it doesn't have yet:
+    viewdata = _with_viewcounts(new_pagelist)
+    known_data.insert(viewdata.loc[known_data.new_ids(viewdata.index)])
+    known_data.update_views(viewdata)
 
-    return viewdata
+    # mark everything around here as just seen, for evict_articles():
+    known_data.touch(new_pagelist.index, now)
 
+    return known_data
 
-def get_article_preview(pageid, url=url) -> html.P:
+
+def evict_articles(
+    known_data,
+    lat,
+    lon,
+    max_articles=session_max_articles,
+    low_water=0.8,
+    recency_bucket=session_recency_bucket,
+) -> SpatialIndex:
     """
-    From a pageid, return a dash.html.P element containing the first couple of sentences of the article
-    behind the pageid, retrieved from Wikipedia.
+    Keep a session's known articles within its budget. Once there are more
+    than max_articles, drop down to low_water * max_articles, keeping the
+    most recently seen articles and, among those seen within the same
+    recency_bucket seconds, the ones nearest to lat/lon. The buckets are
+    coarse on purpose: every pan marks its surroundings as seen, so exact
+    timestamps would leave distance nothing to decide. Returns a new,
+    smaller index if articles are evicted.
     """
-    language_context.set_language(current_language)
+    if len(known_data) <= max_articles:
+        return known_data
+
+    viewdata = known_data.frame()
+
+    # distance in degrees, with longitudes shrunk towards the poles:
+    distance = np.hypot(
+        viewdata.lat.to_numpy() - lat,
+        (viewdata.lon.to_numpy() - lon) * np.cos(np.radians(lat)),
+    )
+    # how long ago, in buckets, counted from the latest sighting:
+    last_seen = viewdata.last_seen.to_numpy()
+    age = np.floor((last_seen.max() - last_seen) / recency_bucket)
 
+    # lexsort: the last key is the primary one
+    order = np.lexsort((distance, age))
+    keep = np.sort(order[: int(max_articles * low_water)])
+
+    kept = SpatialIndex(cell_size=known_data.cell_size)
+    kept.insert(viewdata.iloc[keep])
+
+    return kept
+
+
+@cached("preview", ttl=24 * 3600)
+def _fetch_article_preview(pageid, url=url) -> dict:
+    """
+    From a pageid, get the abstract, title and (if any) image URL of the
+    article from Wikipedia.
+    """
     query_params = {
         "action": "query",
         "format": "json",
@@ -167,15 +269,11 @@ def get_article_preview(pageid, url=url) -> html.P:
     # the title
     title = response_dict.get("query").get("pages")[0].get("title")
 
-    article_url = url.replace("w/api.php", "wiki/") + title
-    article_hyperlink = html.A(href=article_url, children=t("zum Artikel"))
-
-    article_preview = [html.P(abstract), article_hyperlink]
-
     # does the response give an image to the article?
     wiki_image_link = response_dict.get("query").get("pages")[0].get("pageimage")
 
-    # if image exists, request and include it; else ignore:
+    # if image exists, request its URL; else ignore:
+    img_url = None
     if wiki_image_link is not None:
         image_query_params = {
             "action": "query",
@@ -188,8 +286,6 @@ def get_article_preview(pageid, url=url) -> html.P:
 
         img_response = requests.get(url, params=image_query_params)
 
-        print(img_response.text)
-
         try:
             img_url = (
                 json.loads(img_response.text)
@@ -201,10 +297,28 @@ def get_article_preview(pageid, url=url) -> html.P:
         except:
             img_url = ""
 
+    return {"abstract": abstract, "title": title, "img_url": img_url}
+
+
+def get_article_preview(pageid, url=url) -> html.P:
+    """
+    From a pageid, return a dash.html.P element containing the first couple of sentences of the article
+    behind the pageid, retrieved from Wikipedia.
+    """
+    language_context.set_language(current_language)
+
+    preview = _fetch_article_preview(pageid, url=url)
+
+    article_url = url.replace("w/api.php", "wiki/") + preview["title"]
+    article_hyperlink = html.A(href=article_url, children=t("zum Artikel"))
+
+    article_preview = [html.P(preview["abstract"]), article_hyperlink]
+
+    if preview["img_url"] is not None:
         article_preview.insert(
             0,
             html.Img(
-                src=img_url,
+                src=preview["img_url"],
                 style={
                     "width": "80%",
                     "marginLeft": "auto",
@@ -217,25 +331,48 @@ def get_article_preview(pageid, url=url) -> html.P:
     return article_preview
 
 
-def get_map(
-    point_collection_df,
-    location,
-    view_range,
-):
-    # filter to the view range:
-    plot_df = (
-        point_collection_df.query(
-            "log_views >= @view_range[0] &" "log_views <= @view_range[1]"
-        )
-        .reset_index()
-        .rename({"index": "pageid"}, axis=1)
-    )
+def _plot_df(points_df) -> pd.DataFrame:
+    """
+    Bring points into the shape plotted by get_map(), with coordinates and
+    colors rounded so they serialize to short JSON numbers.
+    """
+    plot_df = points_df.reset_index().rename({"index": "pageid"}, axis=1)
+
+    # ~1 m precision is plenty for a marker:
+    plot_df["lat"] = plot_df.lat.round(5)
+    plot_df["lon"] = plot_df.lon.round(5)
+    plot_df["log_views"] = plot_df.log_views.round(3)
 
     # keep zero-view articles visible, bump point size to 1:
     plot_df["dotsize"] = plot_df.views.replace(0, 1)
 
-    # align colorscale to the range of known view numbers:
-    global_max_views = max(point_collection_df.log_views)
+    return plot_df
+
+
+def visible_articles(known_data, view_range, bbox=None) -> pd.DataFrame:
+    """
+    The articles the map shows: those of a SpatialIndex within the view
+    range and, if known, the visible map area. Full renders and partial
+    updates both use this, so that they agree on what is on the map.
+    Result shape: df[["title", "lat", "lon", "views", "log_views"]]
+    """
+    return known_data.lookup(known_data.query(bbox, view_range))
+
+
+def get_map(
+    visible_df,
+    location,
+    max_log_views=None,
+):
+    """
+    Render the map with the given articles, see visible_articles().
+    """
+    plot_df = _plot_df(visible_df)
+
+    # align colorscale to the range of known view numbers; the session's
+    # running max, if given, keeps colors stable when articles are evicted:
+    if max_log_views is None:
+        max_log_views = max(visible_df.log_views, default=0)
 
     fig = px.scatter_mapbox(
         plot_df,
@@ -243,7 +380,7 @@ def get_map(
         lon="lon",
         color="log_views",
         color_continuous_scale=colorscale,
-        range_color=(0, global_max_views),
+        range_color=(0, max_log_views),
         size="dotsize",
         hover_name="title",
         hover_data=["views"],
@@ -271,6 +408,29 @@ def get_map(
     return fig
 
 
+def get_map_patch(unsent_df) -> Patch:
+    """
+    Partial update of a figure made by get_map(): appends markers to its
+    trace, so the response grows with the new data, not with all known
+    data. The caller passes only articles the client doesn't have yet,
+    since the client can't tell duplicates apart.
+    """
+    plot_df = _plot_df(unsent_df)
+
+    patch = Patch()
+    trace = patch["data"][0]
+    trace["lat"].extend(plot_df.lat.tolist())
+    trace["lon"].extend(plot_df.lon.tolist())
+    trace["hovertext"].extend(plot_df.title.tolist())
+    trace["marker"]["color"].extend(plot_df.log_views.tolist())
+    trace["marker"]["size"].extend(plot_df.dotsize.tolist())
+    trace["customdata"].extend(
+        np.stack([plot_df.title, plot_df.views, plot_df.pageid]).transpose().tolist()
+    )
+
+    return patch
+
+
 def render_histogram(viewdata, bins=20, view_range=()) -> Figure:
     """
     Bin view data and plot as histogram.
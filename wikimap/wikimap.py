@@ -1,7 +1,16 @@
 from flask import Flask
-from . import init_dashboard
 
+from . import init_dashboard
+from .config import print_boot_report
+from .src.boot_timer import timed, boot_report
 
 app = Flask(__name__, instance_relative_config=False)
-app = init_dashboard(app, route="/")
-app.run(host="0.0.0.0", port=8080, debug=False, load_dotenv=False)
+with timed("init_dashboard"):
+    app = init_dashboard(app, route="/")
+
+# printed rather than logged: nothing configures logging this early:
+if print_boot_report:
+    print(boot_report())
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=8080, debug=False, load_dotenv=False)